@@ -1,12 +1,16 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+# onedir, а не onefile: onefile при каждом запуске распаковывает во временную
+# папку всё, включая OpenCV, и окно ждёт этой распаковки.
+# cv2, numpy и PIL импортируются лениво (importlib), анализ их не видит — hiddenimports.
 
+# ffmpeg в сборку не входит: сегменты длинных видео склеиваются ffmpeg из PATH.
 a = Analysis(
     ['watermark_app.py'],
     pathex=[],
     binaries=[],
     datas=[('Logo', 'Logo')],
-    hiddenimports=['opencv-python'],
+    hiddenimports=['cv2', 'numpy', 'PIL.Image', 'xxhash'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -19,16 +23,13 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='WatermarkApp',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
     upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -37,3 +38,12 @@ exe = EXE(
     entitlements_file=None,
     icon=['Icon\\image.ico'],
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    name='WatermarkApp',
+)
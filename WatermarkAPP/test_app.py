@@ -0,0 +1,20 @@
+"""Точка входа GUI: процесс пула (spawn) импортирует её как __mp_main__ без Qt и без настройки лога."""
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+# так multiprocessing.spawn готовит __main__ в процессе-обработчике
+SPAWN_CHILD = """
+import logging, runpy, sys
+runpy.run_path("watermark_app.py", run_name="__mp_main__")
+print(sorted(m for m in ("PyQt5", "watermark_gui") if m in sys.modules), len(logging.root.handlers))
+"""
+
+
+def test_spawn_child_does_not_load_qt():
+    result = subprocess.run([sys.executable, "-c", SPAWN_CHILD], cwd=HERE, capture_output=True, text=True,
+                            timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["[]", "0"]
@@ -0,0 +1,25 @@
+"""Сравнение бенчмарка с базой: регрессии скорости, памяти и размера результата."""
+from watermark_bench import compare
+
+BASE = {"images/1mp": {"per_second": 100.0, "peak_rss": 200 * 2**20, "unit": "изобр.", "bytes_out": 1000}}
+
+
+def _current(per_second=100.0, peak_rss=200 * 2**20, bytes_out=1000):
+    return {"images/1mp": {"per_second": per_second, "peak_rss": peak_rss, "unit": "изобр.", "bytes_out": bytes_out}}
+
+
+def test_within_threshold_is_not_regression():
+    assert compare(_current(per_second=95.0, peak_rss=210 * 2**20, bytes_out=1050), BASE, 0.1) == []
+
+
+def test_regressions_are_reported():
+    regressions = compare(_current(per_second=80.0, peak_rss=300 * 2**20, bytes_out=1500), BASE, 0.1)
+    assert len(regressions) == 3
+    assert regressions[0].startswith("images/1mp: 100.0 -> 80.0")
+    assert "RSS 200 -> 300" in regressions[1] and "размер 1000 -> 1500" in regressions[2]
+
+
+def test_new_and_failed_cases_are_ignored():
+    current = dict(_current(per_second=1.0), **{"video/4k": {"per_second": 1.0, "peak_rss": 1, "unit": "кадр."}})
+    assert compare(current, {"images/1mp": {"error": "нет кодека"}}, 0.1) == []
+    assert compare({"images/1mp": {"error": "упал"}}, BASE, 0.1) == []
@@ -0,0 +1,70 @@
+"""blend_logo_roi против прежнего float-смешивания: отличие не больше 1 в канале."""
+import numpy as np
+import pytest
+from PIL import Image
+
+from watermark_engine import PreparedLogoCache, blend_logo_roi
+from watermark_bench import legacy_blend
+
+
+def _logo(size, seed):
+    rng = np.random.default_rng(seed)
+    array = rng.integers(0, 256, (size[1], size[0], 4), dtype=np.uint8)
+    array[:4, :, 3] = 0      # полностью прозрачные
+    array[-4:, :, 3] = 255   # и полностью непрозрачные строки
+    return Image.fromarray(array, "RGBA")
+
+
+def _legacy_clipped(frame, prepared, x, y):
+    """Прежнее смешивание для логотипа, выходящего за край: кадр расширяется полями на время наложения."""
+    lw, lh = prepared.size
+    h, w = frame.shape[:2]
+    px, py = lw + 8, lh + 8
+    canvas = np.zeros((h + 2 * py, w + 2 * px, 3), dtype=np.uint8)
+    canvas[py:py + h, px:px + w] = frame
+    canvas = legacy_blend(canvas, prepared, x + px, y + py)
+    return canvas[py:py + h, px:px + w]
+
+
+FRAMES = [(64, 48), (97, 61), (320, 240)]
+LOGOS = [(16, 16), (33, 21), (64, 48)]
+ALPHAS = [1.0, 0.8, 0.35, 0.0]
+
+
+@pytest.mark.parametrize("frame_size", FRAMES)
+@pytest.mark.parametrize("logo_size", LOGOS)
+@pytest.mark.parametrize("alpha", ALPHAS)
+def test_blend_matches_legacy(frame_size, logo_size, alpha):
+    w, h = frame_size
+    lw, lh = logo_size
+    prepared = PreparedLogoCache._prepare(_logo(logo_size, lw * lh), logo_size, alpha, "BGRA")
+    frame = np.random.default_rng(w * h).integers(0, 256, (h, w, 3), dtype=np.uint8)
+    positions = [(0, 0), (w - lw, h - lh), ((w - lw) // 2, (h - lh) // 2),  # внутри кадра
+                 (-lw // 2, -lh // 2), (w - lw // 3, h - lh // 3),           # за левым верхним и правым нижним краем
+                 (-lw // 3, h // 2), (w // 2, -lh + 1),                      # за левым и верхним краем
+                 (w + 5, 0), (0, -lh)]                                       # целиком за кадром
+    for x, y in positions:
+        expected = _legacy_clipped(frame, prepared, x, y)
+        result = blend_logo_roi(frame.copy(), prepared, x, y)
+        diff = np.abs(result.astype(np.int16) - expected.astype(np.int16))
+        assert diff.max() <= 1, f"позиция {(x, y)}: отличие {diff.max()}"
+
+
+def test_blend_keeps_frame_alpha():
+    prepared = PreparedLogoCache._prepare(_logo((32, 32), 1), (32, 32), 0.8, "BGRA")
+    frame = np.random.default_rng(2).integers(0, 256, (50, 70, 4), dtype=np.uint8)
+    result = blend_logo_roi(frame.copy(), prepared, 50, 30)
+    assert np.array_equal(result[:, :, 3], frame[:, :, 3])
+    expected = _legacy_clipped(np.ascontiguousarray(frame[:, :, :3]), prepared, 50, 30)
+    assert np.abs(result[:, :, :3].astype(np.int16) - expected.astype(np.int16)).max() <= 1
+
+
+def test_image_logo_arrays_are_lazy(tmp_path):
+    logo_path = tmp_path / "logo.png"
+    _logo((40, 30), 3).save(logo_path)
+    cache = PreparedLogoCache()
+    prepared = cache.get(str(logo_path), (400, 300), 0.1, 0.8)
+    assert prepared._array is None and prepared._blend is None  # изображениям хватает image для paste
+    assert np.array_equal(prepared.array, np.asarray(prepared.image))
+    assert np.array_equal(prepared.inv_alpha[:, :, 0], 255 - prepared.array[:, :, 3].astype(np.uint16))
+    assert prepared.premultiplied.dtype == np.uint16 and prepared.premultiplied.shape == (30, 40, 3)
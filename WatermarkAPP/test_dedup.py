@@ -0,0 +1,86 @@
+"""Одинаковые входы: один раз в обработку, копии получают результат жёсткой ссылкой."""
+import os
+import shutil
+from pathlib import Path
+
+from PIL import Image
+
+from watermark_dedup import link_output
+from watermark_engine import WatermarkSettings, run_batch
+
+LOGO = Path(__file__).with_name("Logo") / "logo.png"
+
+
+def _settings(output):
+    return WatermarkSettings(logo_path=str(LOGO), logo_scale=0.2, logo_alpha=0.8, logo_position="bottom_right",
+                             offset_x=5, offset_y=5, output_folder=output)
+
+
+def _image(path, color):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (160, 120), color).save(path)
+    return path
+
+
+def _run(files, output):
+    texts, summaries = [], []
+    run_batch(files, _settings(output), report=False, summary=summaries.append,
+              progress=lambda done, text: texts.append(text.split()[0]))
+    return texts, summaries[0]
+
+
+def test_copies_in_batch_are_linked(tmp_path):
+    original = _image(tmp_path / "in" / "a.jpg", (200, 30, 30))
+    copy = tmp_path / "in" / "sub" / "a_export.jpg"
+    copy.parent.mkdir()
+    shutil.copyfile(original, copy)
+    other = _image(tmp_path / "in" / "b.jpg", (30, 200, 30))
+    output = tmp_path / "out"
+    output.mkdir()
+    texts, summary = _run([original, copy, other], output)
+    assert texts == ["Обработка", "Копия", "Обработка"]
+    assert summary["duplicates"] == 1
+    assert os.path.samefile(output / "a.jpg", output / "a_export.jpg")
+    assert not os.path.samefile(output / "a.jpg", output / "b.jpg")
+
+
+def test_copy_of_previous_batch_uses_manifest(tmp_path):
+    original = _image(tmp_path / "in" / "a.jpg", (200, 30, 30))
+    output = tmp_path / "out"
+    output.mkdir()
+    _run([original], output)
+    copy = tmp_path / "in" / "a_again.jpg"
+    shutil.copyfile(original, copy)
+    texts, summary = _run([original, copy], output)
+    assert texts == ["Без", "Копия"] and summary["duplicates"] == 1
+    assert os.path.samefile(output / "a.jpg", output / "a_again.jpg")
+
+
+def test_changed_original_does_not_touch_copy(tmp_path):
+    original = _image(tmp_path / "in" / "a.jpg", (200, 30, 30))
+    copy = tmp_path / "in" / "c.jpg"
+    shutil.copyfile(original, copy)
+    output = tmp_path / "out"
+    output.mkdir()
+    _run([original, copy], output)
+    linked = (output / "c.jpg").read_bytes()
+    _image(original, (10, 10, 250))
+    texts, _ = _run([original, copy], output)
+    assert texts == ["Обработка", "Без"]
+    # прежде общий результат отвязан перед перезаписью: копия осталась прежней
+    assert not os.path.samefile(output / "a.jpg", output / "c.jpg")
+    assert (output / "c.jpg").read_bytes() == linked != (output / "a.jpg").read_bytes()
+
+
+def test_link_output_falls_back_to_copy(tmp_path, monkeypatch):
+    source = tmp_path / "source.jpg"
+    source.write_bytes(b"result")
+    target = tmp_path / "target.jpg"
+    target.write_bytes(b"old")
+
+    def no_links(src, dst):
+        raise OSError("ссылки не поддерживаются")
+
+    monkeypatch.setattr(os, "link", no_links)
+    link_output(source, target)
+    assert target.read_bytes() == b"result" and not os.path.samefile(source, target)
@@ -0,0 +1,135 @@
+"""Журнал заданий: прерванная партия продолжается без пересчёта готовых файлов и сегментов."""
+import shutil
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import watermark_engine
+import watermark_jobs
+from watermark_engine import WatermarkSettings, run_batch
+from watermark_jobs import unfinished_batch
+
+LOGO = Path(__file__).with_name("Logo") / "logo.png"
+
+
+def _settings(output):
+    return WatermarkSettings(logo_path=str(LOGO), logo_scale=0.2, logo_alpha=0.8, logo_position="bottom_right",
+                             offset_x=5, offset_y=5, output_folder=output)
+
+
+def _images(folder, count):
+    folder.mkdir()
+    for i in range(count):
+        Image.new("RGB", (160, 120), (20 * i, 100, 200)).save(folder / f"img_{i}.jpg")
+    return sorted(folder.iterdir())
+
+
+def test_interrupted_batch_resumes_without_redoing(tmp_path):
+    files = _images(tmp_path / "in", 6)
+    output = tmp_path / "out"
+    output.mkdir()
+    settings = _settings(output)
+    cancel = threading.Event()
+    started = []
+
+    def stop_after_three(done, text):
+        if text.startswith("Обработка"):
+            started.append(text)
+            if len(started) == 3:
+                cancel.set()  # третий файл дописывается, дальше партия не идёт
+
+    run_batch(files, settings, journal=[tmp_path / "in"], manifest=False, report=False, cancel=cancel,
+              progress=stop_after_three, dedup=False)
+    first = {p.name: p.stat().st_mtime_ns for p in output.glob("*.jpg")}
+    assert len(first) == 3
+    inputs, _, done = unfinished_batch(output)
+    assert done == 3 and inputs == [str((tmp_path / "in").resolve())]
+
+    texts = []
+    run_batch(files, settings, journal=[tmp_path / "in"], resume=True, manifest=False, report=False,
+              progress=lambda done, text: texts.append(text), dedup=False)
+    assert sum(t.startswith("Уже готово:") for t in texts) == 3
+    assert sum(t.startswith("Обработка") for t in texts) == 3
+    second = {p.name: p.stat().st_mtime_ns for p in output.glob("*.jpg")}
+    assert len(second) == 6  # без повторов вида img_0_1.jpg
+    assert all(second[name] == mtime for name, mtime in first.items())
+    assert unfinished_batch(output) is None
+
+
+def test_pause_holds_new_files(tmp_path):
+    files = _images(tmp_path / "in", 3)
+    output = tmp_path / "out"
+    output.mkdir()
+    pause = threading.Event()
+    pause.set()
+    texts = []
+    worker = threading.Thread(target=run_batch, args=(files, _settings(output)), kwargs=dict(
+        pause=pause, journal=[tmp_path / "in"], manifest=False, report=False,
+        progress=lambda done, text: texts.append(text)))
+    worker.start()
+    worker.join(0.5)
+    assert worker.is_alive() and "Пауза" in texts and not list(output.glob("*.jpg"))
+    pause.clear()
+    worker.join(30)
+    assert not worker.is_alive() and len(list(output.glob("*.jpg"))) == 3
+    assert unfinished_batch(output) is None
+
+
+def _video(folder, frames):
+    folder.mkdir()
+    video = folder / "clip.mp4"
+    writer = cv2.VideoWriter(str(video), cv2.VideoWriter_fourcc(*"mp4v"), 25, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 6, dtype=np.uint8))
+    writer.release()
+    return video
+
+
+def test_checkpoints_without_ffmpeg_warn(tmp_path, monkeypatch, caplog):
+    video = _video(tmp_path / "in", 40)
+    monkeypatch.setattr(watermark_engine.shutil, "which", lambda name: None)
+    assert watermark_engine.plan_video_checkpoints(video, 10) == []
+    assert "ffmpeg не найден" in caplog.text
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="сегменты видео склеивает ffmpeg")
+def test_interrupted_video_resumes_from_segments(tmp_path, monkeypatch):
+    source = tmp_path / "in"
+    video = _video(source, 40)
+    output = tmp_path / "out"
+    output.mkdir()
+    settings = _settings(output)._replace(encoder="fast")
+    cancel = threading.Event()
+    starts = []
+    process_segment = watermark_engine._process_segment
+    add_checkpoint = watermark_jobs.JobJournal.add_checkpoint
+
+    def record_segment(settings, video_path, segment_path, start, count):
+        starts.append(start)
+        return process_segment(settings, video_path, segment_path, start, count)
+
+    def stop_after_first(self, *args):
+        add_checkpoint(self, *args)
+        cancel.set()
+
+    monkeypatch.setattr(watermark_engine, "_process_segment", record_segment)
+    monkeypatch.setattr(watermark_jobs.JobJournal, "add_checkpoint", stop_after_first)
+    run_batch([video], settings, journal=[source], manifest=False, report=False, cancel=cancel,
+              checkpoint_frames=10)
+    first = list(starts)
+    assert 0 in first and len(first) < 4
+    assert not (output / "clip.mp4").exists()
+
+    monkeypatch.setattr(watermark_jobs.JobJournal, "add_checkpoint", add_checkpoint)
+    starts.clear()
+    run_batch([video], settings, journal=[source], resume=True, manifest=False, report=False,
+              checkpoint_frames=10)
+    assert sorted(first + starts) == [0, 10, 20, 30]  # каждый сегмент посчитан ровно один раз
+    cap = cv2.VideoCapture(str(output / "clip.mp4"))
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 40
+    cap.release()
+    assert unfinished_batch(output) is None
@@ -0,0 +1,84 @@
+"""Манифест: неизменённые файлы пропускаются, изменения исходника или настроек — обработка заново."""
+import os
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from watermark_engine import PreparedLogoCache, WatermarkSettings, run_batch, watermark_file
+
+LOGO = Path(__file__).with_name("Logo") / "logo.png"
+
+
+def _settings(output, alpha=0.8):
+    return WatermarkSettings(logo_path=str(LOGO), logo_scale=0.2, logo_alpha=alpha, logo_position="bottom_right",
+                             offset_x=5, offset_y=5, output_folder=output)
+
+
+def _image(path, color):
+    Image.new("RGB", (160, 120), color).save(path)
+    return path
+
+
+def _run(files, settings):
+    texts = []
+    run_batch(files, settings, report=False, dedup=False, progress=lambda done, text: texts.append(text.split()[0]))
+    return texts
+
+
+def _outputs(output):
+    return {p.name: p.stat().st_mtime_ns for p in output.glob("*.jpg")}
+
+
+def test_unchanged_files_are_skipped(tmp_path):
+    files = [_image(tmp_path / "a.jpg", (200, 30, 30)), _image(tmp_path / "b.jpg", (30, 200, 30))]
+    output = tmp_path / "out"
+    output.mkdir()
+    assert _run(files, _settings(output)) == ["Обработка", "Обработка"]
+    first = _outputs(output)
+    assert _run(files, _settings(output)) == ["Без", "Без"]
+    # mtime сдвинулся, содержимое то же — сверка по хэшу, без обработки
+    stat = files[0].stat()
+    os.utime(files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert _run(files, _settings(output)) == ["Без", "Без"]
+    assert _outputs(output) == first
+
+
+def test_changed_source_overwrites_previous_output(tmp_path):
+    files = [_image(tmp_path / "a.jpg", (200, 30, 30)), _image(tmp_path / "b.jpg", (30, 200, 30))]
+    output = tmp_path / "out"
+    output.mkdir()
+    _run(files, _settings(output))
+    first = _outputs(output)
+    _image(files[0], (10, 10, 250))
+    assert sorted(_run(files, _settings(output))) == ["Без", "Обработка"]
+    second = _outputs(output)
+    assert set(second) == set(first)  # прежнее имя, без a_1.jpg
+    assert second["b.jpg"] == first["b.jpg"]
+    with Image.open(output / "a.jpg") as image:
+        assert image.getpixel((5, 5))[2] > 200
+
+
+def test_changed_settings_or_missing_output_invalidate(tmp_path):
+    files = [_image(tmp_path / "a.jpg", (200, 30, 30)), _image(tmp_path / "b.jpg", (30, 200, 30))]
+    output = tmp_path / "out"
+    output.mkdir()
+    _run(files, _settings(output))
+    assert _run(files, _settings(output, alpha=0.5)) == ["Обработка", "Обработка"]
+    (output / "b.jpg").unlink()
+    assert _run(files, _settings(output, alpha=0.5)) == ["Без", "Обработка"]
+    assert set(_outputs(output)) == {"a.jpg", "b.jpg"}
+
+
+def test_unsupported_format_is_an_error_and_not_recorded(tmp_path):
+    gif = tmp_path / "anim.gif"
+    Image.new("RGB", (32, 32), (200, 30, 30)).save(gif)
+    output = tmp_path / "out"
+    output.mkdir()
+    errors = []
+    for _ in range(2):
+        run_batch([gif], _settings(output), report=False, error=lambda name, message: errors.append(name))
+    assert errors == ["anim.gif", "anim.gif"]  # без записи в манифест — и во второй раз ошибка, а не «Без изменений»
+    assert [p.name for p in output.iterdir()] == [".watermark_manifest.sqlite"]
+    with pytest.raises(ValueError, match="не поддерживается"):
+        watermark_file(gif, output / "anim.gif", _settings(output), PreparedLogoCache())
@@ -0,0 +1,153 @@
+"""HTTP-сервис на 127.0.0.1 со случайным портом: /watermark, /batch, 413, 503, /metrics."""
+import io
+import json
+import threading
+import time
+import http.client
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from watermark_engine import WatermarkSettings
+from watermark_service import WatermarkHTTPServer, WatermarkService
+
+LOGO = Path(__file__).with_name("Logo") / "logo.png"
+MAX_BODY = 256 * 1024
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    root = tmp_path_factory.mktemp("service")
+    settings = WatermarkSettings(logo_path=str(LOGO), logo_scale=0.2, logo_alpha=0.8, logo_position="bottom_right",
+                                 offset_x=10, offset_y=10, output_folder=root / "out")
+    service = WatermarkService(settings, workers=1, max_queue=2)
+    service.warm()
+    server = WatermarkHTTPServer(("127.0.0.1", 0), service, MAX_BODY)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    service.root = root
+    service.port = server.server_address[1]
+    yield service
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def _request(service, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", service.port, timeout=60)
+    try:
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response.status, response.getheader("Content-Type"), response.read()
+    finally:
+        connection.close()
+
+
+def _jpeg(size=(320, 240), color=(30, 120, 200)):
+    data = io.BytesIO()
+    Image.new("RGB", size, color).save(data, "JPEG")
+    return data.getvalue()
+
+
+def _input(service, name):
+    path = service.root / name
+    path.write_bytes(_jpeg())
+    return str(path)
+
+
+def test_watermark_returns_image(service):
+    status, content_type, body = _request(service, "POST", "/watermark?format=png&position=top_left", _jpeg())
+    assert status == 200 and content_type == "image/png"
+    image = Image.open(io.BytesIO(body))
+    assert image.size == (320, 240)
+    assert image.convert("RGB").getpixel((15, 15)) != (30, 120, 200)  # логотип наложен в левом верхнем углу
+
+
+def test_watermark_rejects_bad_params(service):
+    status, _, body = _request(service, "POST", "/watermark?scale=2", _jpeg())
+    assert status == 400 and "scale" in json.loads(body)["error"]
+    status, _, _ = _request(service, "POST", "/watermark", b"not an image")
+    assert status == 400
+
+
+def test_watermark_body_too_large(service):
+    status, _, _ = _request(service, "POST", "/watermark", b"\0" * (MAX_BODY + 1))
+    assert status == 413
+
+
+def test_watermark_queue_full(service):
+    # очередь занята заданиями, которые держат процесс, — новое изображение получает 503 без ожидания
+    held = [service.submit(time.sleep, 0.5, block=True) for _ in range(service.max_queue)]
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", service.port, timeout=60)
+        connection.request("POST", "/watermark", body=_jpeg())
+        response = connection.getresponse()
+        assert response.status == 503 and response.getheader("Retry-After") == "1"
+        connection.close()
+    finally:
+        for future in held:
+            future.result()
+
+
+def test_batch_writes_into_output(service):
+    items = [_input(service, "a.jpg"), {"input": _input(service, "b.jpg"), "output": "sub/b_out.jpg"}]
+    status, _, body = _request(service, "POST", "/batch", json.dumps({"items": items, "output_folder": "cms"}))
+    assert status == 200
+    results = json.loads(body)["results"]
+    assert [r["status"] for r in results] == ["ok", "ok"]
+    out = service.output_root / "cms"
+    assert Path(results[0]["output"]) == out / "a.jpg" and (out / "a.jpg").is_file()
+    assert Path(results[1]["output"]) == out / "sub" / "b_out.jpg" and (out / "sub" / "b_out.jpg").is_file()
+
+
+@pytest.mark.parametrize("manifest", [
+    {"output_folder": "../escape"},
+    {"output_folder": "/tmp"},
+    {"output": "../../escape.jpg"},
+])
+def test_batch_rejects_paths_outside_output(service, manifest):
+    item = {"input": _input(service, "c.jpg")}
+    if "output" in manifest:
+        item["output"] = manifest.pop("output")
+    status, _, _ = _request(service, "POST", "/batch", json.dumps(dict(manifest, items=[item])))
+    assert status == 400
+    assert not (service.root / "escape").exists() and not (service.root / "escape.jpg").exists()
+
+
+def test_batch_unsupported_format_is_error(service):
+    gif = service.root / "anim.gif"
+    Image.new("RGB", (32, 32)).save(gif)
+    status, _, body = _request(service, "POST", "/batch", json.dumps({"items": [str(gif)], "output_folder": "gif"}))
+    assert status == 200 and json.loads(body)["results"][0]["status"] == "error"
+    assert not (service.output_root / "gif").exists()
+
+
+def test_batch_rejects_non_string_encoder(service):
+    body = json.dumps({"items": [_input(service, "d.jpg")], "settings": {"encoder": ["x"]}})
+    status, _, response = _request(service, "POST", "/batch", body)
+    assert status == 400 and "encoder" in json.loads(response)["error"]
+
+
+def test_batch_same_explicit_output_once(service):
+    items = [{"input": _input(service, "e.jpg"), "output": "same.jpg"},
+             {"input": _input(service, "f.jpg"), "output": "same.jpg"}]
+    status, _, body = _request(service, "POST", "/batch", json.dumps({"items": items}))
+    assert status == 200
+    results = json.loads(body)["results"]
+    assert [r["status"] for r in results] == ["ok", "error"]
+    assert "занят" in results[1]["error"]
+    # после партии путь освобождается: следующая партия может его перезаписать
+    status, _, body = _request(service, "POST", "/batch", json.dumps({"items": items[:1]}))
+    assert json.loads(body)["results"][0]["status"] == "ok"
+
+
+def test_metrics(service):
+    status, content_type, body = _request(service, "GET", "/metrics")
+    assert status == 200 and content_type.startswith("application/json")
+    metrics = json.loads(body)
+    assert metrics["workers"] == 1 and metrics["max_queue"] == 2 and metrics["queue_depth"] == 0
+    assert metrics["requests_total"] >= 1
+    assert set(metrics["latency_ms"]) == {"p50", "p95", "p99"}
+    status, _, _ = _request(service, "GET", "/nothing")
+    assert status == 404
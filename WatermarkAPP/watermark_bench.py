@@ -0,0 +1,431 @@
+"""Воспроизводимый бенчмарк наложения водяного знака.
+
+Сам генерирует синтетические входы (JPEG/PNG 1, 12 и 50 Мп, MP4 720p, 1080p
+и 4K), прогоняет их через каждый путь обработки (последовательно — группами
+и по одному изображению, пулом процессов, отдельные ядра наложения,
+кодирование в каждом профиле) и записывает изображения/с, кадры/с, пиковый
+RSS и размер результата. Каждый случай идёт в отдельном процессе, чтобы пик
+памяти не смешивался между случаями. Результаты сохраняются в JSON и сравниваются с
+сохранённой базой:
+
+    python watermark_bench.py --output bench.json
+    python watermark_bench.py --baseline bench.json --output bench_new.json
+"""
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+import cv2
+
+import watermark_engine as engine
+
+LOGO_PATH = Path(__file__).parent / "Logo" / "logo.png"
+IMAGE_SIZES = {"1mp": (1280, 800), "12mp": (4000, 3000), "50mp": (8660, 5774)}
+IMAGES_PER_SET = {"1mp": 24, "12mp": 6, "50mp": 2}
+VIDEO_SIZES = {"720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+VIDEOS_PER_SET = 2
+VIDEO_FRAMES = 60
+QUICK_SKIP = ("50mp", "4k")
+KERNEL_MIN_SECONDS = 1.0
+DATA_VERSION = 1  # увеличить при изменении генератора, чтобы пересоздать входы
+
+
+def synthetic_frame(width, height, seed):
+    """Градиент с зерном: сжимается примерно как фотография, а не как шум или заливка."""
+    rng = np.random.default_rng(seed)
+    tile = rng.integers(-12, 12, (256, 256, 3), dtype=np.int16)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    for top in range(0, height, 512):
+        rows = min(512, height - top)
+        y = np.linspace(top / height, (top + rows) / height, rows, dtype=np.float32)[:, None]
+        block = np.empty((rows, width, 3), dtype=np.int16)
+        block[..., 0] = 200 * x + 40 * y
+        block[..., 1] = 60 + 150 * y
+        block[..., 2] = 230 - 120 * x * y
+        noise = np.tile(tile, (rows // 256 + 1, width // 256 + 1, 1))[:rows, :width]
+        frame[top:top + rows] = np.clip(block + noise, 0, 255).astype(np.uint8)
+    return frame
+
+
+def prepare_data(data_dir: Path, quick=False):
+    """Создаёт входы, если их ещё нет; возвращает {имя набора: [файлы]}."""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    stamp = data_dir / f".data_v{DATA_VERSION}"
+    sets = {}
+    for size_name, (w, h) in IMAGE_SIZES.items():
+        if quick and size_name in QUICK_SKIP:
+            continue
+        for fmt in ("jpeg", "png"):
+            folder = data_dir / f"image-{fmt}-{size_name}"
+            files = [folder / f"img_{i:03d}.{'jpg' if fmt == 'jpeg' else 'png'}" for i in range(IMAGES_PER_SET[size_name])]
+            if not stamp.exists() or not all(f.exists() for f in files):
+                folder.mkdir(exist_ok=True)
+                for i, f in enumerate(files):
+                    image = Image.fromarray(synthetic_frame(w, h, seed=i))
+                    if fmt == "jpeg":
+                        image.save(f, "JPEG", quality=90)
+                    else:
+                        image.save(f, "PNG", compress_level=1)
+            sets[folder.name] = files
+    for res_name, (w, h) in VIDEO_SIZES.items():
+        if quick and res_name in QUICK_SKIP:
+            continue
+        folder = data_dir / f"video-{res_name}"
+        files = [folder / f"clip_{i:02d}.mp4" for i in range(VIDEOS_PER_SET)]
+        if not stamp.exists() or not all(f.exists() for f in files):
+            folder.mkdir(exist_ok=True)
+            for i, f in enumerate(files):
+                base = synthetic_frame(w, h, seed=100 + i)
+                writer = cv2.VideoWriter(str(f), cv2.VideoWriter_fourcc(*"mp4v"), 25, (w, h))
+                for n in range(VIDEO_FRAMES):
+                    # сдвиг кадра, чтобы кодек не получал одинаковые кадры
+                    writer.write(np.roll(base, n * 8, axis=1))
+                writer.release()
+        sets[folder.name] = files
+    stamp.touch()
+    return sets
+
+
+def legacy_blend(frame, prepared, x, y):
+    """Прежнее наложение кадра: BGR->BGRA, float64 по каналам, обратно в BGR. Только для сравнения."""
+    lw, lh = prepared.size
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+    alpha = prepared.array[:, :, 3] / 255.0
+    for c in range(3):
+        frame[y:y + lh, x:x + lw, c] = alpha * prepared.array[:, :, c] + (1 - alpha) * frame[y:y + lh, x:x + lw, c]
+    return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+
+
+def group_blend(images, prepared, position):
+    """Наложение группы изображений одного размера и режима одной операцией NumPy. Только для сравнения.
+
+    Области логотипа складываются в массив N x h x w и смешиваются вместе;
+    результат побайтно тот же, что у paste с маской (у RGBA смешивается и альфа).
+    """
+    w, h = images[0].size
+    lw, lh = prepared.size
+    x, y = position
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + lw, w), min(y + lh, h)
+    if x0 >= x1 or y0 >= y1:
+        return
+    box = (x0, y0, x1, y1)
+    lx, ly = x0 - x, y0 - y
+    inv_alpha = prepared.inv_alpha[ly:ly + y1 - y0, lx:lx + x1 - x0]
+    premultiplied = prepared.premultiplied[ly:ly + y1 - y0, lx:lx + x1 - x0]
+    mode = images[0].mode
+    if mode == "RGBA":
+        # альфа логотипа смешивается с альфой фона с той же маской: a * a + фон * (255 - a)
+        alpha = 255 - inv_alpha
+        premultiplied = np.concatenate([premultiplied, alpha * alpha], axis=2)
+    stack = np.empty((len(images), y1 - y0, x1 - x0, len(mode)), np.uint16)
+    for i, image in enumerate(images):
+        stack[i] = np.asarray(image.crop(box))
+    stack *= inv_alpha
+    stack += premultiplied
+    stack += 128
+    stack += stack >> 8
+    stack >>= 8
+    rois = stack.astype(np.uint8)
+    for image, roi in zip(images, rois):
+        image.paste(Image.fromarray(roi, mode), box)
+
+
+def bench_settings(output_folder):
+    return engine.WatermarkSettings(
+        logo_path=str(LOGO_PATH), logo_scale=0.2, logo_alpha=0.8, logo_position="bottom_right",
+        offset_x=20, offset_y=20, output_folder=Path(output_folder),
+    )
+
+
+def case_names(sets):
+    """Все случаи для набора данных: пути обработки и ядра наложения."""
+    names = []
+    for set_name in sets:
+        names.append(f"{set_name}/serial")
+        names.append(f"{set_name}/parallel")
+        if set_name.startswith("video-"):
+            names.append(f"{set_name}/kernel-roi")
+            names.append(f"{set_name}/kernel-legacy")
+        else:
+            # kernel-group — смешивание областей логотипа группы одним массивом против paste
+            names.append(f"{set_name}/kernel-paste")
+            names.append(f"{set_name}/kernel-group")
+        for profile in engine.ENCODER_PROFILES:
+            names.append(f"{set_name}/encode-{profile}")
+    names.append("app/startup")
+    return names
+
+
+def run_startup_case(repeat=5):
+    """Холодный старт окна: время до первой отрисовки по WATERMARK_STARTUP_PROBE, лучший из repeat."""
+    workdir = Path(tempfile.mkdtemp(prefix="watermark_bench_"))
+    probe = workdir / "startup.jsonl"
+    env = dict(os.environ, WATERMARK_STARTUP_PROBE=str(probe))
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        for _ in range(repeat):
+            subprocess.run([sys.executable, str(Path(__file__).with_name("watermark_app.py"))], cwd=workdir,
+                           env=env, check=True, capture_output=True, timeout=120)
+        runs = [json.loads(line) for line in probe.read_text(encoding="utf-8").splitlines()]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    best = min(runs, key=lambda run: run["first_paint_ms"])
+    return {"unit": "starts", "items": 1, "seconds": best["first_paint_ms"] / 1000,
+            "per_second": round(1000 / best["first_paint_ms"], 3), "peak_rss": 0,
+            "imports_ms": best["imports_ms"], "first_paint_ms": best["first_paint_ms"],
+            "heavy_modules": best["heavy_modules"]}
+
+
+def run_case(name, files, workers):
+    """Выполняет случай в текущем процессе и возвращает его метрики."""
+    set_name, path = name.split("/", 1)
+    is_video = set_name.startswith("video-")
+    unit = "frames" if is_video else "images"
+    output_folder = Path(tempfile.mkdtemp(prefix="watermark_bench_"))
+    try:
+        settings = bench_settings(output_folder)
+        if path in ("serial", "parallel"):
+            errors = []
+            results = []
+            start = time.perf_counter()
+            engine.run_batch(files, settings, workers if path == "parallel" else 1,
+                             error=lambda file_name, message: errors.append(f"{file_name}: {message}"),
+                             manifest=False, report=False, summary=results.append)
+            seconds = time.perf_counter() - start
+            if errors:
+                raise RuntimeError("; ".join(errors))
+            items = results[0].get("video_frames", 0) if is_video else results[0]["files"]["ok"]
+            peak_rss = max(results[0]["peak_rss"], engine.peak_rss_bytes())
+        elif path.startswith("encode-"):
+            return _run_encode(path[len("encode-"):], files, output_folder)
+        else:
+            items, seconds = _run_kernel(path, files, settings)
+            peak_rss = engine.peak_rss_bytes()
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+    return {"unit": unit, "items": items, "seconds": round(seconds, 4),
+            "per_second": round(items / seconds, 3) if seconds else None, "peak_rss": peak_rss}
+
+
+def _run_encode(profile_name, files, output_folder):
+    """Только кодирование и запись в профиле: скорость против размера результата.
+
+    Для изображений — кодирование в память, bytes_out — средний размер файла;
+    для видео — запись VIDEO_FRAMES кадров, bytes_out — размер ролика.
+    """
+    profile = engine.ENCODER_PROFILES[profile_name]
+    result = {"profile": profile_name}
+    if files[0].suffix.lower() in engine.VIDEO_EXTENSIONS:
+        frames = _read_frames(files[0])
+        h, w = frames[0].shape[:2]
+        output_path = output_folder / f"encoded{files[0].suffix}"
+        fps = 25
+        done = 0
+        start = time.perf_counter()
+        while True:
+            out = engine.open_video_writer(output_path, fps, (w, h), profile.video_fourccs)
+            for frame in frames:
+                out.write(frame)
+            out.release()
+            done += len(frames)
+            seconds = time.perf_counter() - start
+            if seconds >= KERNEL_MIN_SECONDS:
+                break
+        result.update(unit="frames", bytes_out=output_path.stat().st_size,
+                      fourcc=engine._WORKING_FOURCC[(output_path.suffix.lower(), profile.video_fourccs)])
+    else:
+        images = [Image.open(f) for f in files]
+        for image in images:
+            image.load()
+        settings = bench_settings(output_folder)._replace(encoder=profile_name)
+        names = [output_folder / engine.output_file_name(f, settings) for f in files]
+        sizes = [engine.encode_image(image, name, profile)[0].getbuffer().nbytes for image, name in zip(images, names)]
+        done, seconds = _time_passes(list(zip(images, names)), lambda item: engine.encode_image(*item, profile))
+        result.update(unit="images", bytes_out=sum(sizes) // len(sizes), format=names[0].suffix[1:])
+    result.update(items=done, seconds=round(seconds, 4), per_second=round(done / seconds, 3),
+                  peak_rss=engine.peak_rss_bytes())
+    return result
+
+
+def _read_frames(video_path):
+    cap = cv2.VideoCapture(str(video_path))
+    frames = []
+    while len(frames) < VIDEO_FRAMES:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def _run_kernel(path, files, settings):
+    """Только наложение, без декодирования и кодирования: входы заранее в памяти."""
+    cache = engine.PreparedLogoCache()
+    if path in ("kernel-paste", "kernel-group"):
+        images = [Image.open(f) for f in files]
+        for image in images:
+            image.load()
+
+        def place(image):
+            prepared = cache.get(settings.logo_path, image.size, settings.logo_scale, settings.logo_alpha)
+            return prepared, engine.logo_position_xy(image.size, prepared.size, settings.logo_position,
+                                                     settings.offset_x, settings.offset_y)
+
+        if path == "kernel-group":
+            # все входы набора одного размера — одна группа
+            def composite_group(group):
+                group_blend(group, *place(group[0]))
+            passes, seconds = _time_passes([images], composite_group)
+            return passes * len(images), seconds
+
+        def composite(image):
+            prepared, position = place(image)
+            image.paste(prepared.image, position, prepared.image)
+        return _time_passes(images, composite)
+    frames = _read_frames(files[0])
+    h, w = frames[0].shape[:2]
+    prepared = cache.get(settings.logo_path, (w, h), settings.logo_scale, settings.logo_alpha, "BGRA")
+    x, y = engine.logo_position_xy((w, h), prepared.size, settings.logo_position, settings.offset_x, settings.offset_y)
+    blend = engine.blend_logo_roi if path == "kernel-roi" else legacy_blend
+    return _time_passes(frames, lambda frame: blend(frame, prepared, x, y))
+
+
+def _time_passes(items, func):
+    """Гоняет func по всем items, пока не наберётся KERNEL_MIN_SECONDS: один проход слишком короткий для замера."""
+    done = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            func(item)
+        done += len(items)
+        seconds = time.perf_counter() - start
+        if seconds >= KERNEL_MIN_SECONDS:
+            return done, seconds
+
+
+def _self_command(args, *extra):
+    cmd = [sys.executable, str(Path(__file__).resolve()), *extra, "--data-dir", str(args.data_dir),
+           "--workers", str(args.workers)]
+    if args.quick:
+        cmd.append("--quick")
+    return cmd
+
+
+def run_case_subprocess(name, args):
+    result = subprocess.run(_self_command(args, "--run-case", name), capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = (result.stderr or result.stdout).strip().splitlines()
+        return {"error": lines[-1] if lines else f"код выхода {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def environment():
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+        "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        "numpy": np.__version__, "pillow": Image.__version__, "opencv": cv2.__version__,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Сравнивает с базой; возвращает список регрессий (строки)."""
+    regressions = []
+    print(f"{'случай':<36} {'база/с':>10} {'сейчас/с':>10} {'изм.':>8} {'RSS МБ':>8}")
+    for name, current in results.items():
+        old = baseline.get(name)
+        if not old or "error" in old or "error" in current:
+            continue
+        ratio = current["per_second"] / old["per_second"] if old["per_second"] else 1.0
+        rss_ratio = current["peak_rss"] / old["peak_rss"] if old["peak_rss"] else 1.0
+        mark = ""
+        if ratio < 1 - threshold:
+            mark = " ← медленнее"
+            regressions.append(f"{name}: {old['per_second']} -> {current['per_second']} {current['unit']}/с")
+        if rss_ratio > 1 + threshold:
+            mark += " ← память"
+            regressions.append(f"{name}: RSS {old['peak_rss'] // 2**20} -> {current['peak_rss'] // 2**20} МБ")
+        if old.get("bytes_out") and current.get("bytes_out", 0) > old["bytes_out"] * (1 + threshold):
+            mark += " ← размер"
+            regressions.append(f"{name}: размер {old['bytes_out']} -> {current['bytes_out']} байт")
+        print(f"{name:<36} {old['per_second']:>10} {current['per_second']:>10} {ratio - 1:>+8.1%} "
+              f"{current['peak_rss'] / 2**20:>8.0f}{mark}")
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Бенчмарк наложения водяного знака на синтетических входах.")
+    parser.add_argument("--data-dir", type=Path, default=Path(tempfile.gettempdir()) / "watermark_bench_data",
+                        help="куда складывать сгенерированные входы (переиспользуются между запусками)")
+    parser.add_argument("--quick", action="store_true", help="без 50 Мп и 4K")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процессов для parallel")
+    parser.add_argument("--cases", nargs="*", help="только случаи, содержащие одну из подстрок")
+    parser.add_argument("--repeat", type=int, default=1, help="повторов на случай, берётся лучший")
+    parser.add_argument("--output", type=Path, help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", type=Path, help="сравнить с сохранёнными результатами")
+    parser.add_argument("--threshold", type=float, default=0.1, help="допустимое ухудшение, доля (0.1 = 10%%)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--prepare-only", action="store_true", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.prepare_only:
+        prepare_data(args.data_dir, args.quick)
+        return 0
+    if not args.run_case:
+        # генерация больших входов раздувает пиковый RSS процесса, а на Linux
+        # ru_maxrss наследуется дочерними процессами — поэтому отдельно
+        subprocess.run(_self_command(args, "--prepare-only"), check=True)
+    sets = prepare_data(args.data_dir, args.quick)
+    if args.run_case:
+        set_name = args.run_case.split("/", 1)[0]
+        if set_name == "app":
+            print(json.dumps(run_startup_case()))
+            return 0
+        print(json.dumps(run_case(args.run_case, sets[set_name], max(1, args.workers))))
+        return 0
+    names = [n for n in case_names(sets) if not args.cases or any(c in n for c in args.cases)]
+    results = {}
+    for name in names:
+        best = None
+        for _ in range(max(1, args.repeat)):
+            result = run_case_subprocess(name, args)
+            if "error" in result or best is None or result["per_second"] > best["per_second"]:
+                best = result
+            if "error" in result:
+                break
+        results[name] = best
+        if "error" in best:
+            print(f"{name:<36} ошибка: {best['error']}")
+        else:
+            size = f"  размер {best['bytes_out'] / 2**10:.0f} КБ" if "bytes_out" in best else ""
+            print(f"{name:<36} {best['per_second']:>10} {best['unit']}/с  RSS {best['peak_rss'] / 2**20:.0f} МБ{size}",
+                  flush=True)
+    if args.output:
+        args.output.write_text(json.dumps({"environment": environment(), "workers": args.workers,
+                                           "results": results}, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Регрессии:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Одинаковые входы партии: одна обработка на одно содержимое.
+
+Копии фотографии в разных подпапках и переэкспорт под новым именем
+обрабатываются один раз: первая копия (оригинал) идёт в обработку, остальные
+получают её результат жёсткой ссылкой, а если ссылку сделать нельзя (другой
+диск, FAT) — копией файла. Хэш содержимого считается только у файлов, размер
+которых уже встречался в партии или в манифесте папки результатов, поэтому
+партия без повторов не читает файлы лишний раз.
+"""
+import os
+import shutil
+import logging
+from collections import OrderedDict
+
+from watermark_manifest import XXH3_PREFIX, file_content_hash
+
+
+class Original:
+    """Файл, который обрабатывается (или уже обработан) за все свои копии."""
+
+    def __init__(self, file, output_file, state=None, content_hash=None):
+        self.file = file
+        self.output_file = output_file
+        self.state = state  # (размер, mtime_ns) исходника на момент постановки; None — результат из манифеста
+        self.content_hash = content_hash
+        self.done = state is None
+        self.error = None
+        self.seconds = 0.0  # время обработки оригинала — столько экономит каждая копия
+        self.copies = []  # (file, output_file, stat) копий, ждущих результата оригинала
+
+
+class DuplicateFinder:
+    """Оригиналы партии по размеру; копии находятся по хэшу содержимого.
+
+    Помнит не больше max_originals последних оригиналов и хэшей, чтобы
+    бесконечная партия (наблюдение за папкой) не росла в памяти; копии
+    забытых оригиналов находятся по манифесту.
+    """
+
+    def __init__(self, max_originals=10000):
+        self.max_originals = max_originals
+        self._by_size = {}  # размер -> [Original]
+        self._by_file = {}  # исходник в обработке -> Original
+        self._order = OrderedDict()  # (размер, id) -> Original, от старых к новым
+        self._hashes = OrderedDict()  # (путь, размер, mtime_ns) -> хэш
+
+    def content_hash(self, file, stat, like=None):
+        key = (file, stat.st_size, stat.st_mtime_ns, like is None or like.startswith(XXH3_PREFIX))
+        if key in self._hashes:
+            self._hashes.move_to_end(key)
+            return self._hashes[key]
+        content_hash = self._hashes[key] = file_content_hash(file, like)
+        if len(self._hashes) > self.max_originals:
+            self._hashes.popitem(last=False)
+        return content_hash
+
+    def known_hash(self, file, stat):
+        """Хэш, уже посчитанный при поиске копий, или None."""
+        if stat is None:
+            return None
+        return self._hashes.get((file, stat.st_size, stat.st_mtime_ns, True)) or \
+            self._hashes.get((file, stat.st_size, stat.st_mtime_ns, False))
+
+    def find(self, file, stat, previous=()):
+        """Оригинал с тем же содержимым, что у file, или None.
+
+        previous — [(хэш, путь результата)] из манифеста для входов того же
+        размера: найденный там результат возвращается как готовый оригинал.
+        """
+        originals = self._by_size.get(stat.st_size, [])
+        if not originals and not previous:
+            return None
+        for original in list(originals):
+            try:
+                if original.content_hash is None:
+                    # исходник оригинала хэшируем, только если он не менялся с постановки
+                    original_stat = original.file.stat()
+                    if (original_stat.st_size, original_stat.st_mtime_ns) != original.state:
+                        originals.remove(original)
+                        continue
+                    original.content_hash = self.content_hash(original.file, original_stat)
+                if self.content_hash(file, stat) == original.content_hash:
+                    return original
+            except OSError:
+                originals.remove(original)
+        for content_hash, output_file in previous:
+            try:
+                if output_file.exists() and self.content_hash(file, stat, like=content_hash) == content_hash:
+                    return Original(None, output_file, content_hash=content_hash)
+            except OSError:
+                continue
+        return None
+
+    def add(self, file, stat, output_file):
+        """Запоминает файл, поставленный в обработку, как оригинал для следующих копий."""
+        original = Original(file, output_file, (stat.st_size, stat.st_mtime_ns))
+        self._by_size.setdefault(stat.st_size, []).append(original)
+        self._by_file[file] = original
+        self._order[(stat.st_size, id(original))] = original
+        while len(self._order) > self.max_originals:
+            (size, _), oldest = self._order.popitem(last=False)
+            # забытый оригинал больше не ищется, но его ждущие копии получат результат (_by_file)
+            originals = self._by_size.get(size, [])
+            if oldest in originals:
+                originals.remove(oldest)
+            if not originals:
+                self._by_size.pop(size, None)
+
+    def finished(self, file):
+        """Оригинал file, обработка которого завершилась, или None, если file не оригинал."""
+        return self._by_file.pop(file, None)
+
+
+def detach_output(path):
+    """Отвязывает результат от других жёстких ссылок перед перезаписью на месте,
+    иначе новая обработка изменила бы и результаты копий."""
+    try:
+        if path.stat().st_nlink > 1:
+            path.unlink()
+    except OSError:
+        pass
+
+
+def link_output(source, target):
+    """Результат копии: жёсткая ссылка на результат оригинала или, если нельзя, копия файла."""
+    if os.path.lexists(target):
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError as e:
+        logging.info(f"Жёсткая ссылка {target} невозможна ({e}), файл копируется")
+        shutil.copyfile(source, target)
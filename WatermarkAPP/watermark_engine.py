@@ -0,0 +1,2085 @@
+"""Обработка файлов без GUI: наложение логотипа на изображения и видео.
+
+Модуль не зависит от Qt: его использует окно WatermarkApp, и он же запускается
+из командной строки на серверах без дисплея:
+
+    python watermark_engine.py input/ --logo Logo/logo.png --output output --workers 8
+"""
+import sys
+import os
+import io
+import json
+import time
+import argparse
+import functools
+import importlib
+import logging
+import threading
+import queue
+import shutil
+import subprocess
+import tempfile
+import mimetypes
+import multiprocessing
+import signal
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple
+from watermark_manifest import ProcessedManifest, file_content_hash, settings_fingerprint
+from watermark_report import REPORT_NAME, RunReport, StageTimer
+from watermark_dedup import DuplicateFinder, detach_output, link_output
+from watermark_jobs import (BATCH_DONE, BATCH_STOPPED, DONE, FAILED, IN_PROGRESS, JOURNAL_NAME, PENDING,
+                            JobJournal, unfinished_batch)
+
+
+class _LazyModule:
+    """Заглушка модуля, который импортируется при первом обращении к атрибуту.
+
+    cv2, numpy и PIL грузятся сотни миллисекунд, а окну они нужны только к
+    началу обработки (cv2 — только для видео). После импорта заглушка
+    подменяет себя в globals() настоящим модулем.
+    """
+
+    def __init__(self, module_name, alias):
+        self._module_name = module_name
+        self._alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._module_name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+
+Image = _LazyModule("PIL.Image", "Image")
+cv2 = _LazyModule("cv2", "cv2")
+np = _LazyModule("numpy", "np")
+
+
+def preload_module(module_name):
+    """Импортирует модуль в фоновом потоке, чтобы первый вызов не ждал загрузки."""
+    threading.Thread(target=importlib.import_module, args=(module_name,), daemon=True).start()
+
+
+def logo_target_size(base_size, logo_size, logo_scale):
+    """Размер логотипа для кадра base_size: не больше logo_scale от кадра и не крупнее оригинала."""
+    w, h = base_size
+    lw, lh = logo_size
+    scale = min(w * logo_scale / lw, h * logo_scale / lh, 1)
+    return int(lw * scale), int(lh * scale)
+
+
+class PreparedLogo:
+    """Логотип, подготовленный под конкретный размер и прозрачность.
+
+    Массивы для blend_logo_roi считаются при первом обращении: изображениям
+    (Image.paste) нужен только image. Гонка двух потоков лишь посчитает их дважды.
+    """
+
+    def __init__(self, image, array=None):
+        self.image = image  # PIL RGBA с уже применённой прозрачностью
+        self._array = array
+        self._blend = None
+        self.size = image.size
+
+    @property
+    def array(self):
+        """uint8 HxWx4 в порядке каналов layout (RGBA/BGRA)."""
+        if self._array is None:
+            self._array = np.array(self.image)
+        return self._array
+
+    def _blend_arrays(self):
+        if self._blend is None:
+            alpha = self.array[:, :, 3:4].astype(np.uint16)
+            self._blend = (255 - alpha, self.array[:, :, :3].astype(np.uint16) * alpha)
+        return self._blend
+
+    @property
+    def inv_alpha(self):
+        """uint16 HxWx1, 255 - alpha."""
+        return self._blend_arrays()[0]
+
+    @property
+    def premultiplied(self):
+        """uint16 HxWx3, цвет * alpha (масштаб 255*255)."""
+        return self._blend_arrays()[1]
+
+
+class PreparedLogoCache:
+    """LRU-кэш подготовленных логотипов.
+
+    Ключ — файл логотипа (путь, mtime, размер), целевой размер, прозрачность и
+    порядок каналов, поэтому партия кадров одного разрешения масштабирует
+    логотип один раз.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def file_key(logo_path):
+        st = os.stat(logo_path)
+        return (str(Path(logo_path).resolve()), st.st_mtime_ns, st.st_size)
+
+    def _source(self, file_key):
+        with self._lock:
+            source = self._sources.get(file_key)
+            if source is not None:
+                self._sources.move_to_end(file_key)
+                return source
+        source = Image.open(file_key[0]).convert("RGBA")
+        with self._lock:
+            self._sources[file_key] = source
+            while len(self._sources) > 4:
+                self._sources.popitem(last=False)
+        return source
+
+    def get(self, logo_path, base_size, logo_scale, logo_alpha, layout="RGBA"):
+        file_key = self.file_key(logo_path)
+        source = self._source(file_key)
+        target = logo_target_size(base_size, source.size, logo_scale)
+        key = file_key + (target, float(logo_alpha), layout)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._prepare(source, target, logo_alpha, layout)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _prepare(source, target, logo_alpha, layout):
+        if layout == "BGRA":
+            # видео: как раньше через cv2 (INTER_AREA), альфа усекается до uint8
+            bgra = cv2.cvtColor(np.asarray(source), cv2.COLOR_RGBA2BGRA)
+            array = cv2.resize(bgra, target, interpolation=cv2.INTER_AREA)
+            array[:, :, 3] = (array[:, :, 3].astype(float) * logo_alpha).astype(np.uint8)
+            image = Image.fromarray(cv2.cvtColor(array, cv2.COLOR_BGRA2RGBA), "RGBA")
+            return PreparedLogo(image, array)
+        image = source.resize(target, Image.LANCZOS)
+        image.putalpha(image.split()[3].point(lambda p: int(p * logo_alpha)))
+        return PreparedLogo(image)
+
+    def luminance(self, logo_path, size):
+        """Яркость (0–255) и альфа (0–1) логотипа, уменьшенного до size: для выбора варианта."""
+        file_key = self.file_key(logo_path)
+        key = file_key + (tuple(size), "luminance")
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        array = np.asarray(self._source(file_key).resize(size, Image.BILINEAR), dtype=np.float32)
+        entry = (array[:, :, 0] * 0.299 + array[:, :, 1] * 0.587 + array[:, :, 2] * 0.114, array[:, :, 3] / 255)
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sources.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".wmv"}
+POSITIONS = ('center_top', 'center_bottom', 'top_left', 'top_right', 'bottom_left', 'bottom_right')
+
+
+class EncoderProfile(NamedTuple):
+    """Параметры кодирования результата: скорость кодирования и записи против размера файла."""
+    jpeg_quality: int
+    jpeg_subsampling: int  # 0 — 4:4:4, 1 — 4:2:2, 2 — 4:2:0
+    jpeg_progressive: bool
+    jpeg_optimize: bool
+    png_compress_level: int  # 0–9
+    image_format: str = None  # "webp" и т. п. из RENDITION_FORMATS; None — формат исходника
+    webp_quality: int = 85
+    webp_method: int = 4  # 0 — быстро, 6 — медленно и меньше
+    # кодеки видео по порядку: берётся первый, который открывается в этой сборке OpenCV
+    video_fourccs: tuple = ("H264", "avc1", "mp4v")
+
+
+# balanced — прежнее поведение: JPEG quality=95, PNG по умолчанию Pillow, H264
+ENCODER_PROFILES = {
+    "fast": EncoderProfile(85, 2, False, False, 1, video_fourccs=("mp4v", "H264", "avc1")),
+    "balanced": EncoderProfile(95, 2, False, False, 6),
+    "archival": EncoderProfile(95, 0, True, True, 9),
+    "web": EncoderProfile(85, 2, True, True, 6, image_format="webp"),
+}
+DEFAULT_ENCODER = "balanced"
+
+
+class WatermarkSettings(NamedTuple):
+    """Неизменяемый снимок настроек обработки; его же получают процессы-обработчики."""
+    logo_path: str
+    logo_scale: float
+    logo_alpha: float
+    logo_position: str
+    offset_x: int
+    offset_y: int
+    output_folder: Path
+    renditions: tuple = ()  # Rendition; пусто — один результат по полям выше
+    auto_variant: bool = False  # выбирать logo / logo_inverted / logo_mono по контрасту с фоном
+    encoder: str = DEFAULT_ENCODER  # имя профиля из ENCODER_PROFILES
+
+
+class Rendition(NamedTuple):
+    """Версия результата: свой логотип, позиция, размер и формат, в подпапке name."""
+    name: str
+    logo_path: str
+    logo_scale: float
+    logo_alpha: float
+    logo_position: str
+    offset_x: int
+    offset_y: int
+    max_size: int = None  # длинная сторона результата; None — как у исходника
+    format: str = None    # "jpeg" / "png" / "webp" для изображений; None — как у исходника
+
+
+RENDITION_FORMATS = {"jpeg": ".jpg", "png": ".png", "webp": ".webp"}
+
+
+def encoder_profile(settings: WatermarkSettings):
+    try:
+        return ENCODER_PROFILES[settings.encoder]
+    except KeyError:
+        raise ValueError(f"Неизвестный профиль кодирования: {settings.encoder}") from None
+
+
+def output_file_name(file_path, settings: WatermarkSettings):
+    """Имя результата: как у исходника; изображения в профиле с image_format — со своим расширением."""
+    file_path = Path(file_path)
+    image_format = encoder_profile(settings).image_format
+    if image_format and file_path.suffix.lower() in IMAGE_EXTENSIONS:
+        return file_path.stem + RENDITION_FORMATS[image_format]
+    return file_path.name
+
+
+def settings_to_dict(settings: WatermarkSettings):
+    """Настройки в виде, пригодном для JSON (журнал заданий).
+
+    Пути абсолютные: партию продолжают и из другой рабочей папки.
+    """
+    fields = settings._asdict()
+    fields["logo_path"] = str(Path(settings.logo_path).resolve())
+    fields["output_folder"] = str(Path(settings.output_folder).resolve())
+    fields["renditions"] = [dict(r._asdict(), logo_path=str(Path(r.logo_path).resolve()))
+                            for r in settings.renditions]
+    return fields
+
+
+def settings_from_dict(fields):
+    fields = dict(fields)
+    fields["output_folder"] = Path(fields["output_folder"])
+    fields["renditions"] = tuple(Rendition(**r) for r in fields.get("renditions", ()))
+    return WatermarkSettings(**fields)
+
+
+def load_renditions(spec_path, defaults: WatermarkSettings):
+    """Читает JSON-список версий. Пропущенные поля берутся из defaults,
+    относительные пути логотипов — от папки файла спецификации.
+
+    [{"name": "web", "logo": "Logo/logo_mono.png", "position": "bottom_right",
+      "scale": 0.15, "alpha": 0.8, "offset_x": 20, "offset_y": 20,
+      "max_size": 1600, "format": "jpeg"}, ...]
+    """
+    spec_path = Path(spec_path)
+    try:
+        entries = json.loads(spec_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Не удалось прочитать спецификацию версий {spec_path}: {e}") from e
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"Спецификация версий должна быть непустым списком: {spec_path}")
+    renditions = []
+    for entry in entries:
+        name = str(entry.get("name", "")).strip()
+        if not name or name in (".", "..") or any(c in name for c in '/\\:*?"<>|'):
+            raise ValueError(f"Недопустимое имя версии: {name!r}")
+        if any(r.name == name for r in renditions):
+            raise ValueError(f"Имя версии повторяется: {name}")
+        logo = Path(entry.get("logo", defaults.logo_path))
+        if not logo.is_absolute() and "logo" in entry:
+            logo = spec_path.parent / logo
+        if not logo.is_file():
+            raise ValueError(f"Логотип версии {name} не найден: {logo}")
+        position = entry.get("position", defaults.logo_position)
+        if position not in POSITIONS:
+            raise ValueError(f"Неизвестная позиция версии {name}: {position}")
+        fmt = entry.get("format")
+        if fmt is not None:
+            fmt = "jpeg" if str(fmt).lower() in ("jpg", "jpeg") else str(fmt).lower()
+            if fmt not in RENDITION_FORMATS:
+                raise ValueError(f"Неизвестный формат версии {name}: {fmt}")
+        max_size = entry.get("max_size")
+        renditions.append(Rendition(
+            name=name, logo_path=str(logo.resolve()), logo_scale=float(entry.get("scale", defaults.logo_scale)),
+            logo_alpha=float(entry.get("alpha", defaults.logo_alpha)), logo_position=position,
+            offset_x=int(entry.get("offset_x", defaults.offset_x)),
+            offset_y=int(entry.get("offset_y", defaults.offset_y)),
+            max_size=int(max_size) if max_size else None, format=fmt,
+        ))
+    return tuple(renditions)
+
+
+def rendition_output_path(output_path: Path, rendition: Rendition):
+    """Путь версии: подпапка rendition.name рядом с output_path, расширение по формату."""
+    suffix = RENDITION_FORMATS.get(rendition.format, output_path.suffix)
+    if output_path.suffix.lower() in VIDEO_EXTENSIONS:
+        suffix = output_path.suffix
+    return output_path.parent / rendition.name / (output_path.stem + suffix)
+
+
+class _RenditionNames:
+    """Занятые имена для reserve_output_path при версиях: имя занято, если есть файл хотя бы одной версии."""
+
+    def __init__(self, output_folder, renditions):
+        self.output_folder = Path(output_folder)
+        self.renditions = renditions
+        self.names = {r.name: _existing_names(self.output_folder / r.name) for r in renditions}
+
+    def __contains__(self, name):
+        path = self.output_folder / name
+        return any(rendition_output_path(path, r).name in self.names[r.name] for r in self.renditions)
+
+    def add(self, name):
+        path = self.output_folder / name
+        for r in self.renditions:
+            self.names[r.name].add(rendition_output_path(path, r).name)
+
+
+def logo_position_xy(frame_size, logo_size, position, offset_x, offset_y):
+    """Левый верхний угол логотипа в кадре в зависимости от позиции и отступов."""
+    w, h = frame_size
+    lw, lh = logo_size
+    offset_x, offset_y = int(offset_x), int(offset_y)
+    if position == 'center_bottom':
+        return (w - lw) // 2, h - lh - offset_y
+    if position == 'top_left':
+        return offset_x, offset_y
+    if position == 'top_right':
+        return w - lw - offset_x, offset_y
+    if position == 'bottom_left':
+        return offset_x, h - lh - offset_y
+    if position == 'bottom_right':
+        return w - lw - offset_x, h - lh - offset_y
+    # center_top и неизвестные значения
+    return (w - lw) // 2, offset_y
+
+
+LOGO_VARIANT_SUFFIXES = ("", "_inverted", "_mono")
+# у версий свои логотипы: вариант подбирается только для основного логотипа
+AUTO_VARIANT_WITH_RENDITIONS = ("автовыбор варианта логотипа не сочетается с версиями: "
+                                "логотип каждой версии задаётся в спецификации")
+CONTRAST_SAMPLE = 64  # длинная сторона области под логотипом при замере контраста
+VIDEO_CONTRAST_FRAMES = 5
+
+
+def logo_variants(logo_path):
+    """Варианты логотипа из той же папки: logo.png, logo_inverted.png, logo_mono.png (какие есть)."""
+    path = Path(logo_path)
+    stem = path.stem
+    for suffix in LOGO_VARIANT_SUFFIXES[1:]:
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+            break
+    variants = [path.with_name(stem + suffix + path.suffix) for suffix in LOGO_VARIANT_SUFFIXES]
+    return [str(p) for p in variants if p.is_file()] or [str(path)]
+
+
+def _logo_box(frame_size, settings, cache):
+    """Прямоугольник логотипа в кадре (обрезанный по кадру) и размер выборки для замера."""
+    prepared = cache.get(settings.logo_path, frame_size, settings.logo_scale, settings.logo_alpha)
+    lw, lh = prepared.size
+    x, y = logo_position_xy(frame_size, (lw, lh), settings.logo_position, settings.offset_x, settings.offset_y)
+    box = (max(x, 0), max(y, 0), min(x + lw, frame_size[0]), min(y + lh, frame_size[1]))
+    scale = min(1, CONTRAST_SAMPLE / max(lw, lh))
+    return box, (max(1, round(lw * scale)), max(1, round(lh * scale)))
+
+
+def choose_logo_variant(backgrounds, sample_size, settings, cache, source=""):
+    """Вариант логотипа с наибольшим контрастом к фону.
+
+    backgrounds — яркость области под логотипом (float32, размер sample_size) по
+    одному массиву на кадр. Контраст — средняя по альфе логотипа разница яркостей
+    логотипа и фона в каждой точке, поэтому пёстрый фон учитывается, а не только
+    его средняя яркость.
+    """
+    best_path, best_score = settings.logo_path, -1.0
+    for variant in logo_variants(settings.logo_path):
+        luminance, alpha = cache.luminance(variant, sample_size)
+        weight = float(alpha.sum())
+        if not weight:
+            continue
+        score = sum(float((np.abs(luminance - bg) * alpha).sum()) / weight for bg in backgrounds) / len(backgrounds)
+        if score > best_score:
+            best_path, best_score = variant, score
+    mean = float(np.mean([bg.mean() for bg in backgrounds]))
+    std = float(np.mean([bg.std() for bg in backgrounds]))
+    logging.info(f"Вариант логотипа {Path(best_path).name} для {source}: контраст {best_score:.0f}, "
+                 f"фон {mean:.0f} ± {std:.0f}")
+    return best_path
+
+
+def pick_image_logo(image, settings: WatermarkSettings, cache: PreparedLogoCache, source=""):
+    """Логотип для уже декодированного изображения: замер только по области логотипа, уменьшенной до выборки."""
+    if not settings.auto_variant:
+        return settings.logo_path
+    box, sample_size = _logo_box(image.size, settings, cache)
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return settings.logo_path
+    region = image.crop(box).resize(sample_size, Image.BOX).convert("L")
+    return choose_logo_variant([np.asarray(region, dtype=np.float32)], sample_size, settings, cache, source)
+
+
+def pick_video_logo(video_path, settings: WatermarkSettings, cache: PreparedLogoCache,
+                    samples=VIDEO_CONTRAST_FRAMES):
+    """Логотип для видео целиком: замер по нескольким кадрам, равномерно взятым по длине."""
+    if not settings.auto_variant:
+        return settings.logo_path
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if not size[0] or not size[1]:
+            return settings.logo_path
+        box, sample_size = _logo_box(size, settings, cache)
+        if box[0] >= box[2] or box[1] >= box[3]:
+            return settings.logo_path
+        backgrounds = []
+        for i in range(samples):
+            if total > samples:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, total * (2 * i + 1) // (2 * samples))
+            ret, frame = cap.read()
+            if not ret:
+                break
+            region = cv2.resize(frame[box[1]:box[3], box[0]:box[2]], sample_size, interpolation=cv2.INTER_AREA)
+            backgrounds.append(cv2.cvtColor(region, cv2.COLOR_BGR2GRAY).astype(np.float32))
+    finally:
+        cap.release()
+    if not backgrounds:
+        return settings.logo_path
+    return choose_logo_variant(backgrounds, sample_size, settings, cache, Path(video_path).name)
+
+
+def blend_logo_roi(frame, prepared: PreparedLogo, x, y):
+    """Накладывает подготовленный логотип на кадр на месте и возвращает кадр.
+
+    Считается только область логотипа (обрезанная по границам кадра), в целых
+    числах: round((цвет * a + фон * (255 - a)) / 255). От прежнего float-смешивания
+    отличается не больше чем на 1 в канале. Порядок каналов кадра должен
+    совпадать с layout логотипа, альфа-канал кадра (если есть) не трогается.
+    """
+    h, w = frame.shape[:2]
+    lw, lh = prepared.size
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + lw, w), min(y + lh, h)
+    if x0 >= x1 or y0 >= y1:
+        return frame
+    lx, ly = x0 - x, y0 - y
+    inv_alpha = prepared.inv_alpha[ly:ly + y1 - y0, lx:lx + x1 - x0]
+    premultiplied = prepared.premultiplied[ly:ly + y1 - y0, lx:lx + x1 - x0]
+    roi = frame[y0:y1, x0:x1, :3]
+    acc = roi.astype(np.uint16)
+    acc *= inv_alpha
+    acc += premultiplied
+    # точное деление на 255 с округлением: (v + 128 + ((v + 128) >> 8)) >> 8
+    acc += 128
+    acc += acc >> 8
+    acc >>= 8
+    roi[...] = acc
+    return frame
+
+
+def reserve_output_path(output_path: Path, reserved=None, existing_names=None, renditions=()):
+    """Свободное имя для результата.
+
+    reserved — имена, уже выданные другим файлам этой партии: при параллельной
+    обработке файл появляется на диске позже, чем выбирается следующее имя.
+    existing_names — имена файлов в папке результатов, прочитанные заранее
+    одним os.scandir, чтобы не проверять exists() на каждое имя.
+    renditions — версии: имя свободно, только если свободны пути всех версий
+    (у версий с format разные исходники, например a.jpg и a.png, дают одно имя
+    a.png), и в reserved попадают пути версий.
+    """
+    if reserved is None:
+        reserved = set()
+
+    def taken(path):
+        if any(p in reserved for p in output_paths(path, renditions)):
+            return True
+        return path.name in existing_names if existing_names is not None else \
+            any(p.exists() for p in output_paths(path, renditions))
+
+    new_path = output_path
+    base, ext = output_path.stem, output_path.suffix
+    counter = 0
+    while taken(new_path):
+        counter += 1
+        new_path = output_path.with_name(f"{base}_watermarked_{counter}{ext}")
+    reserved.update(output_paths(new_path, renditions))
+    return new_path
+
+
+def output_paths(output_path: Path, renditions=()):
+    """Файлы, которые пишутся для результата output_path: пути версий или он сам."""
+    if renditions:
+        return [rendition_output_path(output_path, r) for r in renditions]
+    return [output_path]
+
+
+def watermark_file(file_path: Path, output_file: Path, settings: WatermarkSettings, cache: PreparedLogoCache):
+    """Обрабатывает один файл и возвращает отчёт (dict) со временем стадий для статистики партии."""
+    message = unsupported_format(file_path)
+    if message is not None:
+        raise ValueError(message)
+    ext = file_path.suffix.lower()
+    timer = StageTimer()
+    report = {}
+    start = time.perf_counter()
+    logging.info(f"Обработка файла: {file_path} -> {output_file}")
+    if ext in IMAGE_EXTENSIONS:
+        report["kind"] = "image"
+        if settings.renditions:
+            report["buffer_bytes"] = watermark_image_renditions(file_path, output_file, settings, cache, timer)
+        else:
+            report["buffer_bytes"] = watermark_image(file_path, output_file, settings, cache, timer)
+        logging.info(f"Изображение успешно обработано: {output_file}")
+    elif ext in VIDEO_EXTENSIONS:
+        report["kind"] = "video"
+        if settings.renditions:
+            report["frames"] = watermark_video_renditions(file_path, output_file, settings, cache, timer)
+        else:
+            report["frames"] = watermark_video(file_path, output_file, settings, cache, timer=timer)
+        logging.info(f"Видео успешно обработано: {output_file}")
+    report["seconds"] = time.perf_counter() - start
+    report["stages"] = timer.stages
+    if report.get("frames") and report["seconds"]:
+        report["fps"] = round(report["frames"] / report["seconds"], 2)
+    report["bytes_in"] = _file_size(file_path)
+    if settings.renditions:
+        report["bytes_out"] = sum(_file_size(rendition_output_path(output_file, r)) for r in settings.renditions)
+    else:
+        report["bytes_out"] = _file_size(output_file)
+    return report
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def image_buffer_bytes(size, mode):
+    """Размер несжатого буфера PIL: RGB хранится как 4 байта на пиксель, как и RGBA."""
+    w, h = size
+    if mode in ("1", "L", "P"):
+        return w * h
+    if mode.startswith("I;16"):
+        return w * h * 2
+    return w * h * 4
+
+
+VIDEO_ENCODER_FRAMES = 8  # кадров, которые кодировщик держит у себя (оценка)
+
+
+def estimate_job_memory(file_path, settings: WatermarkSettings):
+    """Оценка пиковой памяти обработки файла в байтах — только по заголовку, без декодирования.
+
+    Изображение: декодированный кадр, приведение режима, закодированный результат
+    и копии для версий; видео: кадры в очередях конвейера и у кодировщика.
+    Базовый размер процесса (интерпретатор, библиотеки) не входит. 0 — файл не читается.
+    """
+    file_path = Path(file_path)
+    renditions = settings.renditions or ()
+    try:
+        if file_path.suffix.lower() in VIDEO_EXTENSIONS:
+            cap = cv2.VideoCapture(str(file_path))
+            try:
+                size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            finally:
+                cap.release()
+            frame = size[0] * size[1] * 3
+            # очереди декодирования и наложения, кадры в руках у стадий, кодировщик каждой версии
+            return frame * (2 * VIDEO_QUEUE_SIZE + 3 + VIDEO_ENCODER_FRAMES * max(1, len(renditions)))
+        with Image.open(file_path) as image:
+            size, mode = image.size, image.mode
+    except Exception:
+        return 0
+    decoded = image_buffer_bytes(size, mode)
+    peak = decoded
+    if mode not in ("RGB", "RGBA"):
+        peak += image_buffer_bytes(size, "RGBA")
+    # результат кодируется в память; сжатый обычно меньше половины кадра
+    working = image_buffer_bytes(size, "RGBA")
+    extra = working // 2
+    for rendition in renditions:
+        copy = image_buffer_bytes(_fit_size(size, rendition.max_size), "RGBA")
+        extra = max(extra, copy + copy // 2)
+    return peak + extra
+
+
+def watermark_image(image_path, output_path, settings: WatermarkSettings, cache: PreparedLogoCache,
+                    timer: StageTimer = None):
+    """Накладывает логотип и возвращает оценку пиковых буферов изображения в байтах.
+
+    Изображение остаётся в своём режиме (RGB для JPEG, RGB/RGBA для PNG):
+    paste смешивает только прямоугольник логотипа, без полных копий кадра в
+    RGBA и обратно. Другие режимы (L, P, CMYK...) приводятся к RGB/RGBA, как раньше.
+    Кодирование идёт в память, запись на диск — отдельной стадией timer.
+    """
+    if timer is None:
+        timer = StageTimer()
+    is_png = image_path.suffix.lower() == ".png"
+    with timer.stage("decode"):
+        base = Image.open(image_path)
+        # явный load(): иначе paste по ленивому изображению делает лишнюю полную копию
+        base.load()
+        buffer_bytes = image_buffer_bytes(base.size, base.mode)
+        if base.mode not in ("RGB", "RGBA"):
+            base = base.convert("RGBA" if is_png else "RGB")
+            buffer_bytes += image_buffer_bytes(base.size, base.mode)
+    _paste_logo(base, settings, cache, image_path.name, timer)
+    with timer.stage("encode"):
+        encoded, extra_bytes = encode_image(base, output_path, encoder_profile(settings))
+        buffer_bytes += extra_bytes
+    with timer.stage("write"):
+        with open(output_path, "wb") as f:
+            f.write(encoded.getbuffer())
+    return buffer_bytes
+
+
+def _paste_logo(base, settings: WatermarkSettings, cache: PreparedLogoCache, name, timer: StageTimer):
+    with timer.stage("logo_prepare"):
+        logo_path = pick_image_logo(base, settings, cache, name)
+        prepared = cache.get(logo_path, base.size, settings.logo_scale, settings.logo_alpha)
+    with timer.stage("composite"):
+        position = logo_position_xy(base.size, prepared.size, settings.logo_position,
+                                    settings.offset_x, settings.offset_y)
+        base.paste(prepared.image, position, prepared.image)
+
+
+def watermark_image_bytes(data, settings: WatermarkSettings, cache: PreparedLogoCache, image_format=None,
+                          timer: StageTimer = None):
+    """Накладывает логотип на изображение в памяти (для HTTP-сервиса, без временных файлов).
+
+    image_format — "jpeg" / "png" / "webp"; по умолчанию из профиля кодирования, иначе
+    как у исходника. Возвращает (байты результата, формат).
+    """
+    if timer is None:
+        timer = StageTimer()
+    with timer.stage("decode"):
+        base = Image.open(io.BytesIO(data))
+        base.load()
+        source_format = {"PNG": "png", "WEBP": "webp"}.get(base.format, "jpeg")
+        if base.mode not in ("RGB", "RGBA"):
+            base = base.convert("RGB" if source_format == "jpeg" else "RGBA")
+    image_format = image_format or encoder_profile(settings).image_format or source_format
+    _paste_logo(base, settings, cache, "изображение из запроса", timer)
+    with timer.stage("encode"):
+        encoded, _ = encode_image(base, "result" + RENDITION_FORMATS[image_format], encoder_profile(settings))
+    return encoded.getvalue(), image_format
+
+
+def encode_image(image, output_path, profile: EncoderProfile = None):
+    """Кодирует изображение в память в формате по расширению output_path (PNG, WebP, иначе JPEG)
+    с параметрами profile; возвращает буфер и доп. байты на конвертацию."""
+    if profile is None:
+        profile = ENCODER_PROFILES[DEFAULT_ENCODER]
+    suffix = Path(output_path).suffix.lower()
+    encoded = io.BytesIO()
+    if suffix == ".png":
+        image.save(encoded, "PNG", compress_level=profile.png_compress_level)
+    elif suffix == ".webp":
+        image.save(encoded, "WEBP", quality=profile.webp_quality, method=profile.webp_method)
+    else:
+        extra_bytes = 0
+        if image.mode == "RGBA":
+            # JPEG с альфа-каналом (редкость) — без него, как раньше
+            image = image.convert("RGB")
+            extra_bytes = image_buffer_bytes(image.size, "RGB")
+        image.save(encoded, "JPEG", quality=profile.jpeg_quality, subsampling=profile.jpeg_subsampling,
+                   progressive=profile.jpeg_progressive, optimize=profile.jpeg_optimize)
+        return encoded, extra_bytes
+    return encoded, 0
+
+
+def _fit_size(size, max_size):
+    """Размер, вписанный в max_size по длинной стороне; без увеличения."""
+    w, h = size
+    if not max_size or max(w, h) <= max_size:
+        return size
+    scale = max_size / max(w, h)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def watermark_image_renditions(image_path, output_path, settings: WatermarkSettings, cache: PreparedLogoCache,
+                               timer: StageTimer = None):
+    """Декодирует изображение один раз и пишет все версии settings.renditions.
+
+    Каждая версия — копия (или уменьшенная копия) декодированного кадра, последняя
+    без уменьшения рисуется прямо на нём. Возвращает оценку пиковых буферов в байтах.
+    """
+    if timer is None:
+        timer = StageTimer()
+    is_png = image_path.suffix.lower() == ".png"
+    with timer.stage("decode"):
+        base = Image.open(image_path)
+        base.load()
+        buffer_bytes = image_buffer_bytes(base.size, base.mode)
+        if base.mode not in ("RGB", "RGBA"):
+            base = base.convert("RGBA" if is_png else "RGB")
+            buffer_bytes += image_buffer_bytes(base.size, base.mode)
+    profile = encoder_profile(settings)
+    extra_bytes = 0
+    last = len(settings.renditions) - 1
+    for i, rendition in enumerate(settings.renditions):
+        with timer.stage("composite"):
+            size = _fit_size(base.size, rendition.max_size)
+            if size != base.size:
+                image = base.resize(size, Image.LANCZOS)
+            else:
+                image = base.copy() if i < last else base
+        with timer.stage("logo_prepare"):
+            prepared = cache.get(rendition.logo_path, image.size, rendition.logo_scale, rendition.logo_alpha)
+        with timer.stage("composite"):
+            position = logo_position_xy(image.size, prepared.size, rendition.logo_position,
+                                        rendition.offset_x, rendition.offset_y)
+            image.paste(prepared.image, position, prepared.image)
+        rendition_path = rendition_output_path(output_path, rendition)
+        with timer.stage("encode"):
+            encoded, encode_bytes = encode_image(image, rendition_path, profile)
+        with timer.stage("write"):
+            rendition_path.parent.mkdir(exist_ok=True)
+            with open(rendition_path, "wb") as f:
+                f.write(encoded.getbuffer())
+        copy_bytes = image_buffer_bytes(image.size, image.mode) if image is not base else 0
+        extra_bytes = max(extra_bytes, copy_bytes + encode_bytes)
+    return buffer_bytes + extra_bytes
+
+
+PREVIEW_MAX_SIZE = 400  # длинная сторона уменьшенной копии для превью
+
+
+def load_preview_proxy(path, max_size=PREVIEW_MAX_SIZE):
+    """Уменьшенная копия файла для превью и размер исходника; для видео — первый кадр.
+
+    JPEG через draft() декодируется сразу в 1/2–1/8 размера, так что даже
+    100-мегапиксельный исходник не разворачивается в память целиком.
+    """
+    path = Path(path)
+    if path.suffix.lower() in VIDEO_EXTENSIONS:
+        cap = cv2.VideoCapture(str(path))
+        ret, frame = cap.read()
+        cap.release()
+        if not ret:
+            raise ValueError(f"Не удалось прочитать кадр видео: {path}")
+        source_size = (frame.shape[1], frame.shape[0])
+        scale = min(1, max_size / max(source_size))
+        frame = cv2.resize(frame, (max(1, int(source_size[0] * scale)), max(1, int(source_size[1] * scale))),
+                           interpolation=cv2.INTER_AREA)
+        return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)), source_size
+    image = Image.open(path)
+    source_size = image.size
+    image.draft("RGB", (max_size, max_size))
+    image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    return image, source_size
+
+
+class PreviewRenderer:
+    """Превью с логотипом на уменьшенной копии исходника.
+
+    Копии исходников и уменьшенные логотипы кэшируются, поэтому при движении
+    ползунков перерисовка — это только paste маленького логотипа.
+    """
+
+    def __init__(self, cache: PreparedLogoCache = None, max_size=PREVIEW_MAX_SIZE):
+        self.cache = cache if cache is not None else PreparedLogoCache()
+        self.max_size = max_size
+        self._proxies = OrderedDict()
+        self._logos = OrderedDict()
+
+    @staticmethod
+    def _lru_put(entries, key, value, maxsize):
+        entries[key] = value
+        while len(entries) > maxsize:
+            entries.popitem(last=False)
+
+    def proxy(self, path):
+        key = PreparedLogoCache.file_key(path) + (self.max_size,)
+        entry = self._proxies.get(key)
+        if entry is None:
+            entry = load_preview_proxy(path, self.max_size)
+            self._lru_put(self._proxies, key, entry, 4)
+        else:
+            self._proxies.move_to_end(key)
+        return entry
+
+    def render(self, path, settings: WatermarkSettings):
+        """PIL-изображение превью: логотип того же относительного размера и отступов, что в результате."""
+        proxy, source_size = self.proxy(path)
+        factor = proxy.width / source_size[0]
+        if settings.auto_variant:
+            # выбор варианта — по самой копии, с отступами в её масштабе
+            proxy_settings = settings._replace(offset_x=round(settings.offset_x * factor),
+                                               offset_y=round(settings.offset_y * factor))
+            settings = settings._replace(logo_path=pick_image_logo(proxy, proxy_settings, self.cache, "превью"))
+        # размер логотипа считаем от исходника: он ограничен размером оригинала логотипа
+        prepared = self.cache.get(settings.logo_path, source_size, settings.logo_scale, settings.logo_alpha)
+        logo_size = (max(1, round(prepared.size[0] * factor)), max(1, round(prepared.size[1] * factor)))
+        key = (id(prepared), logo_size)
+        logo = self._logos.get(key)
+        if logo is None or logo[0] is not prepared:
+            logo = (prepared, prepared.image.resize(logo_size, Image.LANCZOS))
+            self._lru_put(self._logos, key, logo, 16)
+        logo = logo[1]
+        position = logo_position_xy(proxy.size, logo.size, settings.logo_position,
+                                    round(settings.offset_x * factor), round(settings.offset_y * factor))
+        result = proxy.copy()
+        result.paste(logo, position, logo)
+        return result
+
+
+def peak_rss_bytes():
+    """Пиковый RSS текущего процесса в байтах; 0, если платформа его не сообщает."""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss_bytes()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_peak_rss_bytes():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    except Exception:
+        return 0
+
+
+class VideoSeekError(ValueError):
+    """VideoCapture не смог точно встать на нужный кадр."""
+
+
+class _FrameRange:
+    """Обёртка над VideoCapture, отдающая не больше count кадров (None — до конца)."""
+
+    def __init__(self, cap, count=None):
+        self.cap = cap
+        self.count = count
+        self.frames = 0
+
+    def read(self):
+        if self.count is not None and self.frames >= self.count:
+            return False, None
+        ret, frame = self.cap.read()
+        if ret:
+            self.frames += 1
+        return ret, frame
+
+
+def watermark_video(video_path, output_path, settings: WatermarkSettings, cache: PreparedLogoCache,
+                    start=0, count=None, timer: StageTimer = None):
+    """Накладывает логотип на кадры [start, start + count) и возвращает число записанных кадров."""
+    if timer is None:
+        timer = StageTimer()
+    if settings.auto_variant:
+        with timer.stage("logo_prepare"):
+            settings = settings._replace(logo_path=pick_video_logo(video_path, settings, cache), auto_variant=False)
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise ValueError(f"Не удалось открыть видео: {video_path}")
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+            cap.release()
+            raise VideoSeekError(f"Не удалось перейти к кадру {start}: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    try:
+        out = open_video_writer(output_path, fps, (width, height), encoder_profile(settings).video_fourccs)
+    except ValueError:
+        cap.release()
+        raise
+
+    try:
+        with timer.stage("logo_prepare"):
+            prepared = cache.get(settings.logo_path, (width, height), settings.logo_scale, settings.logo_alpha,
+                                 "BGRA")
+    except Exception as e:
+        cap.release()
+        out.release()
+        raise ValueError(f"Не удалось загрузить логотип: {settings.logo_path}") from e
+    x_offset, y_offset = logo_position_xy((width, height), prepared.size, settings.logo_position,
+                                          settings.offset_x, settings.offset_y)
+
+    try:
+        return run_video_pipeline(_FrameRange(cap, count), out,
+                                  lambda frame: blend_logo_roi(frame, prepared, x_offset, y_offset), timer=timer)
+    finally:
+        cap.release()
+        out.release()
+
+
+_WORKING_FOURCC = {}  # (расширение, цепочка кодеков) -> кодек, который открылся в прошлый раз
+
+
+def open_video_writer(output_path, fps, size, fourccs=None):
+    """VideoWriter для результата на первом кодеке из fourccs, который открывается в этой
+    сборке OpenCV (в некоторых нет H264); ValueError, если не открылся ни один."""
+    fourccs = tuple(fourccs or ENCODER_PROFILES[DEFAULT_ENCODER].video_fourccs)
+    key = (Path(output_path).suffix.lower(), fourccs)
+    known = _WORKING_FOURCC.get(key)
+    # удачный кодек пробуем первым: каждая неудачная попытка — это открытие файла и кодировщика
+    chain = (known,) + tuple(f for f in fourccs if f != known) if known else fourccs
+    for fourcc in chain:
+        out = cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if out.isOpened():
+            if known != fourcc:
+                _WORKING_FOURCC[key] = fourcc
+                if fourcc != fourccs[0]:
+                    logging.warning(f"Кодек {fourccs[0]} недоступен, видео пишется в {fourcc}")
+            return out
+        out.release()
+    raise ValueError(f"Не удалось создать выходное видео ({', '.join(fourccs)}): {output_path}")
+
+
+class _WriterFanOut:
+    """Раздаёт список кадров (по одному на версию) по своим VideoWriter."""
+
+    def __init__(self, writers):
+        self.writers = writers
+
+    def write(self, frames):
+        for writer, frame in zip(self.writers, frames):
+            writer.write(frame)
+
+
+def watermark_video_renditions(video_path, output_path, settings: WatermarkSettings, cache: PreparedLogoCache,
+                               timer: StageTimer = None):
+    """Читает видео один раз и пишет все версии settings.renditions одновременно; возвращает число кадров."""
+    if timer is None:
+        timer = StageTimer()
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise ValueError(f"Не удалось открыть видео: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fourccs = encoder_profile(settings).video_fourccs
+    writers = []
+    targets = []
+    try:
+        for rendition in settings.renditions:
+            size = _fit_size((width, height), rendition.max_size)
+            if size != (width, height):
+                # кодекам нужны чётные размеры
+                size = (max(2, size[0] - size[0] % 2), max(2, size[1] - size[1] % 2))
+            rendition_path = rendition_output_path(output_path, rendition)
+            rendition_path.parent.mkdir(exist_ok=True)
+            writers.append(open_video_writer(rendition_path, fps, size, fourccs))
+            with timer.stage("logo_prepare"):
+                prepared = cache.get(rendition.logo_path, size, rendition.logo_scale, rendition.logo_alpha, "BGRA")
+            x, y = logo_position_xy(size, prepared.size, rendition.logo_position,
+                                    rendition.offset_x, rendition.offset_y)
+            targets.append((size, prepared, x, y))
+        last = len(targets) - 1
+
+        def composite(frame):
+            frames = []
+            for i, (size, prepared, x, y) in enumerate(targets):
+                if size != (width, height):
+                    target = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                else:
+                    target = frame.copy() if i < last else frame
+                frames.append(blend_logo_roi(target, prepared, x, y))
+            return frames
+
+        return run_video_pipeline(cap, _WriterFanOut(writers), composite, timer=timer)
+    finally:
+        cap.release()
+        for writer in writers:
+            writer.release()
+
+
+SEGMENT_MIN_FRAMES = 1500  # короче 2 * SEGMENT_MIN_FRAMES видео обрабатывается целиком
+
+
+def plan_video_segments(video_path, workers, min_frames=SEGMENT_MIN_FRAMES):
+    """Делит видео на диапазоны кадров [(start, count), ...] для параллельной обработки.
+
+    Пустой список — обрабатывать целиком: видео короткое, процесс один или нет
+    ffmpeg для склейки без перекодирования. Последний сегмент читается до конца
+    файла (count=None), поэтому неточный CAP_PROP_FRAME_COUNT не теряет кадры.
+    """
+    if workers < 2 or shutil.which("ffmpeg") is None:
+        return []
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        return []
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    segments = min(workers, frame_count // min_frames)
+    if segments < 2:
+        return []
+    size = frame_count // segments
+    return [(i * size, size) for i in range(segments - 1)] + [((segments - 1) * size, None)]
+
+
+CHECKPOINT_FRAMES = 1500  # кадров в сегменте длинного видео при ведении журнала
+
+
+def plan_video_checkpoints(video_path, frames=None):
+    """Сегменты по frames (CHECKPOINT_FRAMES) кадров для продолжения длинного видео после сбоя;
+    [] — видео короткое или нет ffmpeg (тогда предупреждение: продолжение начнёт видео сначала)."""
+    frames = frames or CHECKPOINT_FRAMES
+    cap = cv2.VideoCapture(str(video_path))
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+    cap.release()
+    segments = total // frames
+    if segments < 2:
+        return []
+    if shutil.which("ffmpeg") is None:
+        logging.warning(f"{video_path}: ffmpeg не найден в PATH, видео ({total} кадров) пишется без "
+                        f"сохранения сегментов — после прерывания оно обработается заново с первого кадра")
+        return []
+    # последний сегмент — до конца видео: счётчик кадров контейнера бывает неточным
+    return [(i * frames, frames) for i in range(segments - 1)] + [((segments - 1) * frames, None)]
+
+
+def concat_video_segments(segment_paths, output_path):
+    """Склеивает сегменты по порядку через ffmpeg concat без перекодирования."""
+    list_file = segment_paths[0].parent / "segments.txt"
+    lines = []
+    for path in segment_paths:
+        escaped = path.resolve().as_posix().replace("'", "'\\''")
+        lines.append(f"file '{escaped}'\n")
+    list_file.write_text("".join(lines), encoding="utf-8")
+    cmd = [shutil.which("ffmpeg"), "-y", "-v", "error", "-f", "concat", "-safe", "0",
+           "-i", str(list_file), "-c", "copy", str(output_path)]
+    # без мигающего окна консоли в собранном Windows-приложении
+    flags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    result = subprocess.run(cmd, capture_output=True, text=True, creationflags=flags)
+    if result.returncode != 0:
+        raise ValueError(f"ffmpeg не смог склеить сегменты: {result.stderr.strip()}")
+
+
+class VideoInterrupted(Exception):
+    """Обработка видео остановлена между сегментами; готовые сегменты сохранены в журнале."""
+
+
+def watermark_video_segments(video_path, output_path, settings: WatermarkSettings, segments, executor,
+                             cache: PreparedLogoCache = None, journal: JobJournal = None, cancel=None,
+                             max_parallel=None):
+    """Обрабатывает сегменты видео параллельно в executor и склеивает их по порядку.
+
+    Если кодек не даёт точно перейти к кадру, видео обрабатывается целиком,
+    чтобы число и порядок кадров совпадали с обычной обработкой.
+    journal — сегменты пишутся в постоянную папку рядом с результатом и
+    отмечаются в журнале, так что после перезапуска готовые не пересчитываются.
+    cancel — threading.Event: не начатые сегменты отменяются (VideoInterrupted).
+    max_parallel — сколько сегментов отдавать в executor одновременно (бюджет памяти).
+    """
+    if settings.auto_variant:
+        # вариант логотипа выбирается один раз на всё видео, а не в каждом сегменте
+        logo_path = pick_video_logo(video_path, settings, cache or PreparedLogoCache())
+        settings = settings._replace(logo_path=logo_path, auto_variant=False)
+    if journal is not None:
+        tmp_dir = output_path.parent / f".{output_path.stem}_segments"
+        tmp_dir.mkdir(exist_ok=True)
+        done = journal.checkpoints(video_path)
+    else:
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{output_path.stem}_segments_", dir=output_path.parent))
+        done = {}
+    finished = False
+    futures = {}
+    try:
+        segment_paths = [tmp_dir / f"segment_{i:04d}{output_path.suffix}" for i in range(len(segments))]
+        written = [None] * len(segments)
+        todo = []
+        for i, (path, (start, count)) in enumerate(zip(segment_paths, segments)):
+            checkpoint = done.get(i)
+            if checkpoint is not None and checkpoint[:2] == (start, count) and path.exists():
+                written[i] = checkpoint[2]
+            else:
+                todo.append(i)
+        if done and len(todo) < len(segments):
+            logging.info(f"Видео продолжается с сохранённых сегментов: {len(segments) - len(todo)} "
+                         f"из {len(segments)} готовы, {video_path}")
+        todo.reverse()
+        pending = set()
+        while todo or pending:
+            while todo and (max_parallel is None or len(pending) < max_parallel) and not (
+                    cancel is not None and cancel.is_set()):
+                i = todo.pop()
+                start, count = segments[i]
+                future = executor.submit(_process_segment, settings, video_path, segment_paths[i], start, count)
+                futures[future] = i
+                pending.add(future)
+            if cancel is not None and cancel.is_set():
+                todo.clear()
+                for future in pending:
+                    future.cancel()
+            if not pending:
+                break
+            completed, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in completed:
+                if future.cancelled():
+                    continue
+                i = futures[future]
+                written[i] = future.result()
+                if journal is not None and written[i] >= 0:
+                    journal.add_checkpoint(video_path, i, segments[i][0], segments[i][1], written[i])
+        if any(n is None for n in written):
+            ready = sum(n is not None for n in written)
+            raise VideoInterrupted(f"Видео остановлено: готово сегментов {ready} из {len(segments)}")
+        complete = all(n >= 0 and (count is None or n == count) for n, (_, count) in zip(written, segments))
+        if complete:
+            concat_video_segments(segment_paths, output_path)
+            logging.info(f"Видео обработано по сегментам ({len(segments)}): {sum(written)} кадров")
+            finished = True
+            return sum(written)
+        finished = True
+    finally:
+        for future in futures:
+            # при исключении (Ctrl+C) не оставляем сегменты в очереди пула
+            future.cancel()
+        # с журналом недописанные сегменты остаются для продолжения
+        if finished or journal is None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if journal is not None:
+                journal.clear_checkpoints(video_path)
+    logging.warning(f"Сегменты видео не совпали по кадрам, обработка целиком: {video_path}")
+    return watermark_video(video_path, output_path, settings, cache or PreparedLogoCache())
+
+
+VIDEO_QUEUE_SIZE = 8  # кадров в каждой очереди конвейера
+_END_OF_STREAM = object()
+
+
+def run_video_pipeline(cap, out, composite, queue_size=VIDEO_QUEUE_SIZE, timer: StageTimer = None):
+    """Прогоняет кадры cap -> composite -> out конвейером из трёх стадий.
+
+    Декодирование и наложение идут в своих потоках, кодирование — в вызывающем;
+    стадии связаны очередями по queue_size кадров, поэтому в памяти держится не
+    больше 2 * queue_size + 3 кадров. cv2 отпускает GIL в read()/write(), так что
+    декодирование и кодирование действительно идут одновременно. Порядок кадров
+    сохраняется; ошибка любой стадии останавливает остальные и пробрасывается.
+    Время стадий (decode, composite, encode) суммируется в timer.
+    Возвращает число записанных кадров.
+    """
+    if timer is None:
+        timer = StageTimer()
+    clock = time.perf_counter
+    decoded = queue.Queue(maxsize=queue_size)
+    composited = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END_OF_STREAM
+
+    def decode_stage():
+        try:
+            while True:
+                start = clock()
+                ret, frame = cap.read()
+                timer.add("decode", clock() - start)
+                if not ret or not put(decoded, frame):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(decoded, _END_OF_STREAM)
+
+    def composite_stage():
+        try:
+            while True:
+                frame = get(decoded)
+                if frame is _END_OF_STREAM:
+                    break
+                start = clock()
+                frame = composite(frame)
+                timer.add("composite", clock() - start)
+                if not put(composited, frame):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(composited, _END_OF_STREAM)
+
+    workers = [threading.Thread(target=decode_stage, name="video-decode", daemon=True),
+               threading.Thread(target=composite_stage, name="video-composite", daemon=True)]
+    for t in workers:
+        t.start()
+    written = 0
+    try:
+        while True:
+            frame = get(composited)
+            if frame is _END_OF_STREAM:
+                break
+            start = clock()
+            out.write(frame)
+            timer.add("encode", clock() - start)
+            written += 1
+    except Exception as e:
+        errors.append(e)
+    finally:
+        if errors:
+            stop.set()
+        for t in workers:
+            t.join()
+    if errors:
+        raise errors[0]
+    return written
+
+
+# кэш логотипов внутри процесса-обработчика (у каждого процесса свой)
+_worker_cache = None
+
+
+def _init_worker():
+    # Ctrl+C в консоли получает вся группа процессов; останавливает партию родитель,
+    # а обработчики дописывают начатые файлы
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _get_worker_cache():
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = PreparedLogoCache()
+    return _worker_cache
+
+
+def _process_job(settings: WatermarkSettings, file_path: Path, output_file: Path, want_hash=False):
+    """Обрабатывает файл в процессе-обработчике; в отчёте — хэш исходника для манифеста и пик памяти."""
+    report = watermark_file(file_path, output_file, settings, _get_worker_cache())
+    if want_hash:
+        report["content_hash"] = file_content_hash(file_path)
+    report["peak_rss"] = peak_rss_bytes()
+    return report
+
+
+def _process_segment(settings: WatermarkSettings, video_path: Path, segment_path: Path, start, count):
+    """Сегмент видео в процессе-обработчике; -1 — не удалось встать на нужный кадр."""
+    try:
+        return watermark_video(video_path, segment_path, settings, _get_worker_cache(), start, count)
+    except VideoSeekError as e:
+        logging.warning(str(e))
+        return -1
+
+
+@functools.lru_cache(maxsize=None)
+def is_media_suffix(suffix):
+    """Подходит ли расширение (в нижнем регистре); mimetypes спрашиваем раз на расширение."""
+    if suffix in IMAGE_EXTENSIONS or suffix in VIDEO_EXTENSIONS:
+        return True
+    mime = mimetypes.guess_type(f"file{suffix}")[0]
+    return bool(mime and mime.startswith(('image/', 'video/')))
+
+
+def unsupported_format(file_path):
+    """Сообщение об ошибке, если формат файла не обрабатывается, иначе None.
+
+    Обход (is_media_suffix) берёт и прочие image/* и video/* — GIF, BMP, TIFF: они
+    попадают в партию ошибкой, а не пропадают молча.
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix in IMAGE_EXTENSIONS or suffix in VIDEO_EXTENSIONS:
+        return None
+    return (f"формат {suffix or 'без расширения'} не поддерживается: "
+            "нужны JPG, PNG или видео MP4, MOV, AVI, MKV, WEBM, WMV")
+
+
+def iter_media_files(paths, cancel=None):
+    """Генератор изображений и видео: файлы как есть, папки — рекурсивно через os.scandir.
+
+    Файлы отдаются по мере обхода, поэтому обработка может начаться до того,
+    как обойдена вся папка. cancel — threading.Event для досрочной остановки.
+    """
+    for path in paths:
+        path = Path(path)
+        if cancel is not None and cancel.is_set():
+            return
+        if path.is_dir():
+            stack = [path]
+            while stack:
+                if cancel is not None and cancel.is_set():
+                    return
+                folder = stack.pop()
+                try:
+                    with os.scandir(folder) as entries:
+                        subdirs = []
+                        for entry in entries:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    subdirs.append(Path(entry.path))
+                                elif entry.is_file() and is_media_suffix(os.path.splitext(entry.name)[1].lower()):
+                                    yield Path(entry.path)
+                            except OSError:
+                                continue
+                except OSError as e:
+                    logging.warning(f"Не удалось прочитать папку {folder}: {e}")
+                    continue
+                stack.extend(reversed(sorted(subdirs)))
+        elif path.is_file() and is_media_suffix(path.suffix.lower()):
+            yield path
+
+
+def find_media_files(paths):
+    """Разворачивает папки и отбирает изображения и видео (список целиком)."""
+    return list(iter_media_files(paths))
+
+
+DISCOVERY_QUEUE_SIZE = 10000  # найденных, но ещё не взятых в работу файлов
+
+
+class _Discovery:
+    """Обход источников в отдельном потоке, находки — в ограниченную очередь."""
+
+    def __init__(self, files, cancel):
+        self.found = 0
+        self.finished = False
+        self.seconds = 0.0  # время самого обхода, без ожидания места в очереди
+        self._cancel = cancel
+        self._queue = queue.Queue(maxsize=DISCOVERY_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, args=(files,), name="discovery", daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._cancel.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self, files):
+        clock = time.perf_counter
+        try:
+            files = iter(files)
+            while not self._cancel.is_set():
+                start = clock()
+                file = next(files, _END_OF_STREAM)
+                self.seconds += clock() - start
+                if file is _END_OF_STREAM or not self._put(file):
+                    break
+                self.found += 1
+        except Exception as e:
+            logging.error(f"Ошибка обхода файлов: {e}")
+        finally:
+            self.finished = True
+            self._put(_END_OF_STREAM)
+
+    def get(self, timeout=None):
+        """Следующий файл; None — пока ничего нет, _END_OF_STREAM — обход закончен или отменён."""
+        if self._cancel.is_set():
+            return _END_OF_STREAM
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __iter__(self):
+        while True:
+            file = self.get(timeout=0.1)
+            if file is _END_OF_STREAM:
+                return
+            if file is not None:
+                yield file
+
+
+def _noop(*args):
+    pass
+
+
+def _existing_names(folder):
+    try:
+        with os.scandir(folder) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+
+def _safe_stat(path):
+    try:
+        return path.stat()
+    except OSError:
+        return None
+
+
+class _Batch:
+    """Общее состояние партии: манифест, журнал заданий, выданные имена, счётчики прогресса."""
+
+    def __init__(self, settings, discovery, progress, error, total, manifest, force, report, journal=None,
+                 resume=False, pause=None, dedup=True, checkpoint_frames=CHECKPOINT_FRAMES):
+        self.settings = settings
+        self.discovery = discovery
+        self.progress = progress
+        self.error = error
+        self.total = total
+        self.force = force
+        self.report = report
+        self.book = ProcessedManifest(settings.output_folder) if manifest else None
+        self.fingerprint = None
+        if self.book is not None:
+            variants = logo_variants(settings.logo_path) if settings.auto_variant else ()
+            self.fingerprint = settings_fingerprint(settings, variants)
+        if settings.renditions:
+            self.existing = _RenditionNames(settings.output_folder, settings.renditions)
+        else:
+            self.existing = _existing_names(settings.output_folder)
+        # имена результатов выдаём заранее, чтобы параллельные процессы не столкнулись;
+        # когда файл готов, имя переходит из reserved в existing
+        self.reserved = set()
+        self.planned = {}  # исходник в обработке -> выданный путь результата
+        self.done = 0
+        self.skipped = 0
+        self.max_buffer_bytes = 0
+        self.peak_rss = 0
+        self._reported_total = -1
+        self.pause = pause
+        self.checkpoint_frames = checkpoint_frames  # 0 — длинные видео с журналом без сегментов
+        self.interrupted = False
+        self.journal = None
+        if journal is not None:
+            self.journal = JobJournal(settings.output_folder)
+            self.journal.open_batch(journal, settings_to_dict(settings), resume)
+        self.duplicates = DuplicateFinder() if dedup else None
+
+    def report_total(self):
+        found = self.discovery.found
+        if found != self._reported_total:
+            self._reported_total = found
+            self.total(found)
+
+    def step(self, text, file):
+        self.done += 1
+        self.report_total()
+        suffix = "" if self.discovery.finished else "…"
+        self.progress(self.done, f"{text} {file.name} ({self.done}/{self.discovery.found}{suffix})")
+
+    def wait_if_paused(self, cancel):
+        """Пауза между файлами: начатые дорабатываются, новые не берутся, пока пауза не снята."""
+        if self.pause is None or not self.pause.is_set():
+            return
+        self.progress(self.done, "Пауза")
+        while self.pause.is_set() and not cancel.is_set():
+            time.sleep(0.1)
+
+    def plan(self, file):
+        """Задание (file, output_file, stat) или None, если файл не изменился или уже готов по журналу."""
+        message = unsupported_format(file)
+        if message is not None:
+            # без имени результата и без записи в манифест: такой файл не обработается и в следующий раз
+            self.step("Ошибка", file)
+            self.failed(file, message)
+            return None
+        recorded = None
+        if self.journal is not None:
+            status, recorded = self.journal.job(file)
+            if status == DONE and recorded is not None and recorded.name in self.existing and not self.force:
+                self.skipped += 1
+                self.report.file_skipped(file)
+                self.step("Уже готово:", file)
+                return None
+        if recorded is not None and not self._claimed(recorded):
+            # продолжение прерванной партии: файл пишется под тем же именем
+            self._claim(recorded)
+            self.planned[file] = recorded
+            self._detach(recorded)
+            return file, recorded, self._journal_pending(file, recorded)
+        previous = None
+        if self.book is not None:
+            try:
+                skip, previous = self.book.check(file, self.fingerprint, self.existing)
+            except OSError:
+                # файл пропал или не читается — ошибку покажет обработка
+                skip = False
+            if skip and not self.force:
+                self.skipped += 1
+                self.report.file_skipped(file)
+                self.step("Без изменений:", file)
+                return None
+        stat = _safe_stat(file)
+        original = self._find_original(file, stat)
+        name = output_file_name(file, self.settings)
+        if previous is not None and not self._claimed(previous) and previous.suffix == Path(name).suffix:
+            # изменившийся файл перезаписывает свой прежний результат (если не сменился формат)
+            self._claim(previous)
+            output_file = previous
+            self._detach(previous)
+        else:
+            output_file = reserve_output_path(self.settings.output_folder / name, self.reserved, self.existing,
+                                              self.settings.renditions)
+        self.planned[file] = output_file
+        if self.journal is not None:
+            self.journal.mark(file, PENDING, output_file)
+        if original is not None:
+            if original.error is not None:
+                self.step("Ошибка", file)
+                self.failed(file, f"{original.error} (копия {original.file.name})")
+            elif original.done:
+                self._copy_result(original, file, output_file, stat)
+            else:
+                original.copies.append((file, output_file, stat))
+            return None
+        if self.duplicates is not None and stat is not None:
+            self.duplicates.add(file, stat, output_file)
+        return file, output_file, stat
+
+    def _journal_pending(self, file, output_file):
+        if self.journal is not None:
+            self.journal.mark(file, PENDING, output_file)
+        return _safe_stat(file)
+
+    def _outputs(self, output_file):
+        return output_paths(output_file, self.settings.renditions)
+
+    def _claimed(self, output_file):
+        return any(path in self.reserved for path in self._outputs(output_file))
+
+    def _claim(self, output_file):
+        self.reserved.update(self._outputs(output_file))
+
+    def _release(self, file):
+        """Файл готов или упал: имя больше не держится в reserved (партия при наблюдении
+        бесконечна), записанный результат занимает имя через existing. Перезаписанный
+        потом исходник снова получит это имя — как previous из манифеста."""
+        output_file = self.planned.pop(file, None)
+        if output_file is None:
+            return
+        paths = self._outputs(output_file)
+        self.reserved.difference_update(paths)
+        if any(path.exists() for path in paths):
+            self.existing.add(output_file.name)
+
+    def idle(self):
+        """Новых файлов пока нет: манифест и отчёт сбрасываются на диск."""
+        if self.book is not None:
+            self.book.flush()
+        self.report.flush()
+
+    def _detach(self, output_file):
+        # результат, общий с копиями по жёсткой ссылке, перед перезаписью становится отдельным файлом
+        if self.duplicates is not None:
+            for path in self._outputs(output_file):
+                detach_output(path)
+
+    def _find_original(self, file, stat):
+        """Оригинал с тем же содержимым (в партии или по манифесту) или None."""
+        if self.duplicates is None or stat is None:
+            return None
+        previous = ()
+        if self.book is not None and not self.force:
+            previous = self.book.same_size(file, stat.st_size, self.fingerprint)
+        try:
+            return self.duplicates.find(file, stat, previous)
+        except OSError:
+            # файл не читается — ошибку покажет обработка
+            return None
+
+    def _copy_result(self, original, file, output_file, stat):
+        """Результат копии из результата оригинала, без декодирования и кодирования."""
+        self.step("Копия", file)
+        start = time.perf_counter()
+        try:
+            for source, target in zip(self._outputs(original.output_file), self._outputs(output_file)):
+                link_output(source, target)
+        except OSError as e:
+            self.failed(file, str(e))
+            return
+        self.succeeded(file, output_file, stat, {
+            "kind": "duplicate", "seconds": time.perf_counter() - start,
+            "duplicate_of": str(original.file or original.output_file), "saved_seconds": original.seconds,
+            "bytes_in": _file_size(file), "bytes_out": sum(_file_size(p) for p in self._outputs(output_file)),
+            "content_hash": original.content_hash})
+
+    def started(self, file):
+        if self.journal is not None:
+            self.journal.mark(file, IN_PROGRESS)
+
+    def succeeded(self, file, output_file, stat, report):
+        self.max_buffer_bytes = max(self.max_buffer_bytes, report.get("buffer_bytes", 0))
+        self.peak_rss = max(self.peak_rss, report.get("peak_rss", 0))
+        self.report.file_done(file, output_file, report)
+        if self.book is not None and stat is not None:
+            content_hash = (report.get("content_hash") or self.duplicates is not None
+                            and self.duplicates.known_hash(file, stat) or file_content_hash(file))
+            self.book.record(file, stat, content_hash, self.fingerprint, output_file)
+        if self.journal is not None:
+            self.journal.mark(file, DONE)
+        self._release(file)
+        original = self.duplicates.finished(file) if self.duplicates is not None else None
+        if original is not None:
+            original.done = True
+            original.seconds = report.get("seconds", 0.0)
+            for copy in original.copies:
+                self._copy_result(original, *copy)
+            original.copies = []
+
+    def failed(self, file, message):
+        self.report.file_failed(file, message)
+        self.error(file.name, message)
+        if self.journal is not None:
+            self.journal.mark(file, FAILED, error=message)
+        self._release(file)
+        original = self.duplicates.finished(file) if self.duplicates is not None else None
+        if original is not None:
+            # у копии то же содержимое — обработка упала бы так же
+            original.error = message
+            for copy_file, _, _ in original.copies:
+                self.step("Ошибка", copy_file)
+                self.failed(copy_file, f"{message} (копия {file.name})")
+
+    def video(self, file, output_file, stat, segments, executor, cache, cancel, max_parallel=None):
+        """Длинное видео по сегментам (с журналом — с сохранением готовых сегментов)."""
+        try:
+            start = time.perf_counter()
+            frames = watermark_video_segments(file, output_file, self.settings, segments, executor, cache,
+                                              self.journal, cancel, max_parallel)
+            seconds = time.perf_counter() - start
+            self.succeeded(file, output_file, stat, {
+                "kind": "video", "frames": frames, "seconds": seconds, "fps": round(frames / seconds, 2),
+                "bytes_in": _file_size(file), "bytes_out": _file_size(output_file)})
+        except VideoInterrupted as e:
+            # файл остаётся in_progress: при продолжении досчитаются только недостающие сегменты
+            self.interrupted = True
+            logging.info(f"{file.name}: {e}")
+        except Exception as e:
+            self.failed(file, str(e))
+
+    def close(self, completed=False):
+        """Закрывает манифест, журнал и отчёт, возвращает итог партии.
+
+        completed — все найденные файлы обработаны; иначе партию можно продолжить.
+        """
+        if self.journal is not None:
+            self.journal.close(BATCH_DONE if completed and not self.interrupted else BATCH_STOPPED)
+        if self.skipped:
+            logging.info(f"Пропущено без изменений: {self.skipped}")
+        if self.max_buffer_bytes or self.peak_rss:
+            logging.info(f"Память: буферы изображения до {self.max_buffer_bytes / 2**20:.1f} МБ, "
+                         f"пиковый RSS процесса {max(self.peak_rss, peak_rss_bytes()) / 2**20:.1f} МБ")
+        if self.book is not None:
+            self.book.close()
+        self.report.discover_seconds = self.discovery.seconds
+        summary = self.report.close()
+        stages = ", ".join(f"{name} p50 {v['p50_ms']:.1f} / p95 {v['p95_ms']:.1f} мс"
+                           for name, v in summary["stages"].items())
+        logging.info(f"Итог партии: {summary['files']}, {summary['wall_seconds']} с, "
+                     f"{summary['files_per_second']} файлов/с, {summary['mb_per_second']} МБ/с; {stages}")
+        return summary
+
+
+def run_batch(files, settings: WatermarkSettings, workers=1, cache: PreparedLogoCache = None,
+              progress=_noop, error=_noop, manifest=True, force=False, total=_noop, cancel=None,
+              report=True, summary=_noop, journal=None, resume=False, pause=None, memory_budget=None,
+              dedup=True, checkpoint_frames=CHECKPOINT_FRAMES):
+    """Обрабатывает файлы по мере поступления и возвращает число найденных файлов.
+
+    files — список или генератор (например, iter_media_files): он обходится в
+    отдельном потоке, и обработка начинается, не дожидаясь конца обхода.
+    workers > 1 — пул процессов, длинные видео режутся на сегменты.
+    progress(done, text), error(file_name, message) и total(found) вызываются
+    из вызывающего потока; total сообщает, сколько файлов найдено к этому моменту.
+    manifest — вести манифест в папке результатов и пропускать файлы, у которых
+    не менялись ни исходник, ни настройки; force — обработать всё заново.
+    cancel — threading.Event: обход и постановка новых файлов прекращаются,
+    уже начатые файлы дорабатываются.
+    report — дописывать JSONL-отчёт (строка на файл и итог) в REPORT_NAME в
+    папке результатов; можно передать свой путь. summary(dict) получает итог:
+    p50/p95 по стадиям, файлы/с, МБ/с, кадры/с для видео.
+    journal — входы партии (пути, из которых получены files): вести журнал
+    заданий в папке результатов, длинные видео писать сегментами с
+    сохранением готовых; resume — продолжить последнюю незавершённую партию
+    из журнала. pause — threading.Event: пока установлен, новые файлы не берутся.
+    memory_budget — байт на задания пула одновременно (оценка по заголовкам файлов,
+    estimate_job_memory): мелкие файлы заполняют свободный бюджет, крупные ждут места.
+    dedup — копии одного содержимого (в партии и среди обработанных раньше по
+    манифесту) не обрабатывать, а получать результат оригинала жёсткой ссылкой.
+    checkpoint_frames — с журналом длинные видео пишутся сегментами по столько
+    кадров и склеиваются ffmpeg без перекодирования, чтобы после сбоя досчитать
+    только недописанные; 0 — видео целиком (после сбоя — заново).
+    """
+    if settings.auto_variant and settings.renditions:
+        raise ValueError(AUTO_VARIANT_WITH_RENDITIONS)
+    if cache is None:
+        cache = PreparedLogoCache()
+    if cancel is None:
+        cancel = threading.Event()
+    if report is True:
+        report = Path(settings.output_folder) / REPORT_NAME
+    discovery = _Discovery(files, cancel)
+    batch = _Batch(settings, discovery, progress, error, total, manifest, force,
+                   RunReport(report or None, workers), journal, resume, pause, dedup, checkpoint_frames)
+    completed = False
+    try:
+        if workers > 1:
+            _run_pool(batch, settings, workers, cache, cancel, memory_budget)
+        else:
+            _run_serial(batch, settings, cache, cancel)
+        batch.report_total()
+        completed = discovery.finished and not cancel.is_set()
+    finally:
+        result = batch.close(completed)
+    summary(result)
+    return discovery.found
+
+
+def _run_serial(batch, settings, cache, cancel):
+    while True:
+        batch.wait_if_paused(cancel)
+        if cancel.is_set():
+            break
+        file = batch.discovery.get(timeout=0.1)
+        if file is None:
+            batch.idle()
+            continue
+        if file is _END_OF_STREAM:
+            break
+        job = batch.plan(file)
+        if job is None:
+            continue
+        file, output_file, stat = job
+        batch.started(file)
+        batch.step("Обработка", file)
+        segments = []
+        if (batch.journal is not None and batch.checkpoint_frames and file.suffix.lower() in VIDEO_EXTENSIONS
+                and not settings.renditions):
+            segments = plan_video_checkpoints(file, batch.checkpoint_frames)
+        if segments:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                batch.video(file, output_file, stat, segments, executor, cache, cancel)
+            continue
+        try:
+            report = watermark_file(file, output_file, settings, cache)
+            report["peak_rss"] = peak_rss_bytes()
+            batch.succeeded(file, output_file, stat, report)
+        except Exception as e:
+            batch.failed(file, str(e))
+
+
+class _MemoryBudget:
+    """Допуск заданий в пул: сумма оценок памяти заданий в работе не больше budget байт.
+
+    Задание больше всего бюджета допускается, когда в работе ничего нет. Без
+    бюджета (0 или None) оценки не считаются и ограничивает только число процессов.
+    """
+
+    def __init__(self, budget, settings):
+        self.budget = budget or 0
+        self.settings = settings
+        self.used = 0
+
+    def estimate(self, file):
+        if not self.budget:
+            return 0
+        need = estimate_job_memory(file, self.settings)
+        if need > self.budget:
+            logging.info(f"{file.name}: оценка памяти {need / 2**20:.0f} МБ больше бюджета "
+                         f"{self.budget / 2**20:.0f} МБ, файл обрабатывается один")
+        return need
+
+    def fits(self, need):
+        return not self.budget or not self.used or self.used + need <= self.budget
+
+    def acquire(self, need):
+        self.used += need
+
+    def release(self, need):
+        self.used -= need
+
+    def segments_at_once(self, need, workers):
+        """Сколько сегментов видео по need байт помещается в бюджет одновременно."""
+        if not self.budget or not need:
+            return workers
+        return max(1, min(workers, self.budget // need))
+
+
+def _run_pool(batch, settings, workers, cache, cancel, memory_budget=None):
+    # spawn, а не fork: форк процесса с живым Qt и потоками небезопасен
+    context = multiprocessing.get_context("spawn")
+    want_hash = batch.book is not None
+    # в полёте держим ограниченное число заданий, остальное ждёт в очереди обхода
+    max_in_flight = workers * 4
+    budget = _MemoryBudget(memory_budget, settings)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        futures = {}
+        long_videos = []
+        exhausted = False
+        held = None  # задание, которому не хватило бюджета памяти: ждёт первым, без обгона
+        try:
+            while True:
+                paused = batch.pause is not None and batch.pause.is_set()
+                while (held is not None or not exhausted) and not paused and len(futures) < max_in_flight:
+                    if held is None:
+                        file = batch.discovery.get(timeout=0 if futures else 0.1)
+                        if file is None:
+                            if not futures:
+                                batch.idle()
+                            break
+                        if file is _END_OF_STREAM:
+                            exhausted = True
+                            break
+                        job = batch.plan(file)
+                        if job is None:
+                            continue
+                        file, output_file, stat = job
+                        batch.started(file)
+                        # версии пишутся за одно чтение видео, на сегменты не режем
+                        segments = []
+                        if file.suffix.lower() in VIDEO_EXTENSIONS and not settings.renditions:
+                            segments = plan_video_segments(file, workers)
+                            if batch.journal is not None and batch.checkpoint_frames:
+                                # с журналом — короткие сегменты, чтобы после сбоя терять меньше
+                                segments = plan_video_checkpoints(file, batch.checkpoint_frames) or segments
+                        if segments:
+                            long_videos.append(job + (segments,))
+                            continue
+                        held = job + (budget.estimate(file),)
+                    if not budget.fits(held[3]):
+                        break
+                    file, output_file, stat, need = held
+                    budget.acquire(need)
+                    futures[pool.submit(_process_job, settings, file, output_file, want_hash)] = held
+                    held = None
+                batch.report_total()
+                if cancel.is_set():
+                    for future in futures:
+                        future.cancel()
+                if not futures:
+                    if long_videos and not paused and not cancel.is_set():
+                        # пул свободен: длинное видео режется на сегменты, которые встают в тот же пул.
+                        # Конца обхода не ждём — при наблюдении за папкой он не наступает
+                        file, output_file, stat, segments = long_videos.pop(0)
+                        at_once = budget.segments_at_once(budget.estimate(file), workers)
+                        batch.video(file, output_file, stat, segments, pool, cache, cancel, at_once)
+                        batch.step("Обработан", file)
+                        continue
+                    if (exhausted and held is None) or cancel.is_set():
+                        break
+                    if paused:
+                        batch.wait_if_paused(cancel)
+                    continue
+                finished, _ = wait(futures, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    file, output_file, stat, need = futures.pop(future)
+                    budget.release(need)
+                    if future.cancelled():
+                        continue
+                    batch.step("Обработан", file)
+                    try:
+                        report = future.result()
+                        if need:
+                            report["memory_estimate"] = need
+                        batch.succeeded(file, output_file, stat, report)
+                    except Exception as e:
+                        batch.failed(file, str(e))
+        except BaseException:
+            # иначе выход из with (например, по Ctrl+C) дождётся всех заданий в очереди пула
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Пакетное наложение логотипа на изображения и видео без GUI.")
+    parser.add_argument("inputs", nargs="*", type=Path, help="файлы и папки для обработки")
+    parser.add_argument("--logo", type=Path, help="файл логотипа (PNG с прозрачностью)")
+    parser.add_argument("--position", choices=POSITIONS, default="center_top", help="позиция логотипа")
+    parser.add_argument("--offset-x", type=int, default=20, help="отступ по X, пикселей")
+    parser.add_argument("--offset-y", type=int, default=20, help="отступ по Y, пикселей")
+    parser.add_argument("--scale", type=float, default=0.2, help="размер логотипа, доля кадра (0.1–1.0)")
+    parser.add_argument("--alpha", type=float, default=1.0, help="непрозрачность логотипа (0–1)")
+    parser.add_argument("--output", type=Path, default=Path("output"), help="папка для результатов")
+    parser.add_argument("--auto-variant", action="store_true",
+                        help="для каждого файла выбирать вариант логотипа (обычный, _inverted, _mono) "
+                             "с лучшим контрастом к фону под ним; не сочетается с --renditions")
+    parser.add_argument("--renditions", type=Path,
+                        help="JSON со списком версий (логотип, позиция, размер, формат): исходник "
+                             "декодируется один раз, каждая версия пишется в свою подпапку")
+    parser.add_argument("--encoder", choices=ENCODER_PROFILES, default=DEFAULT_ENCODER,
+                        help="профиль кодирования: fast — быстрее и крупнее, archival — медленнее и точнее "
+                             "(JPEG 4:4:4), web — изображения в WebP; balanced — как раньше")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument("--memory-budget", type=int, default=0, metavar="МБ",
+                        help="память на одновременно обрабатываемые файлы пула: задания допускаются по оценке "
+                             "из заголовков, крупные ждут места (0 — без ограничения)")
+    parser.add_argument("--force", action="store_true",
+                        help="обработать всё заново, даже файлы без изменений по манифесту")
+    parser.add_argument("--no-manifest", action="store_true",
+                        help="не вести манифест обработанных файлов в папке результатов")
+    parser.add_argument("--checkpoint-frames", type=int, default=CHECKPOINT_FRAMES, metavar="N",
+                        help="с журналом писать длинные видео сегментами по N кадров (нужен ffmpeg), чтобы после "
+                             "сбоя досчитать только недописанные; 0 — видео целиком")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="обрабатывать каждую копию одинакового файла, а не ссылаться на результат первой")
+    parser.add_argument("--report", type=Path,
+                        help=f"куда дописывать JSONL-отчёт (по умолчанию {REPORT_NAME} в папке результатов)")
+    parser.add_argument("--no-report", action="store_true", help="не писать JSONL-отчёт")
+    parser.add_argument("--watch", action="store_true",
+                        help="следить за входными папками и обрабатывать новые файлы, когда они дописаны "
+                             "(до Ctrl+C)")
+    parser.add_argument("--watch-interval", type=float, default=1.0,
+                        help="секунд между опросами папок в режиме --watch")
+    parser.add_argument("--resume", action="store_true",
+                        help="продолжить прерванную партию из журнала заданий в папке результатов "
+                             "(входы и настройки берутся из журнала)")
+    parser.add_argument("--no-journal", action="store_true",
+                        help=f"не вести журнал заданий ({JOURNAL_NAME}) в папке результатов")
+    parser.add_argument("--log-file", help="писать подробный лог в файл")
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.log_file:
+        logging.basicConfig(filename=args.log_file, level=logging.INFO,
+                            format='%(asctime)s - %(levelname)s - %(message)s', encoding='utf-8')
+    else:
+        logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    if args.resume:
+        if args.no_journal or args.watch:
+            parser.error("--resume нельзя сочетать с --no-journal и --watch")
+        unfinished = unfinished_batch(args.output)
+        if unfinished is None:
+            parser.error(f"в {args.output} нет прерванной партии")
+        inputs, fields, done = unfinished
+        args.inputs = [Path(p) for p in inputs]
+        settings = settings_from_dict(fields)
+        print(f"Продолжение партии: готово {done}, входы: {', '.join(inputs)}", flush=True)
+    else:
+        if not args.inputs:
+            parser.error("не указаны файлы и папки для обработки")
+        if args.logo is None:
+            parser.error("не указан --logo")
+        if not args.logo.is_file():
+            parser.error(f"логотип не найден: {args.logo}")
+        if not 0 < args.scale <= 1 or not 0 <= args.alpha <= 1:
+            parser.error("--scale должен быть в (0, 1], --alpha — в [0, 1]")
+        args.output.mkdir(parents=True, exist_ok=True)
+        settings = WatermarkSettings(
+            logo_path=str(args.logo.resolve()), logo_scale=args.scale, logo_alpha=args.alpha,
+            logo_position=args.position, offset_x=args.offset_x, offset_y=args.offset_y,
+            output_folder=args.output.resolve(), auto_variant=args.auto_variant, encoder=args.encoder,
+        )
+        if args.renditions:
+            try:
+                settings = settings._replace(renditions=load_renditions(args.renditions, settings))
+            except ValueError as e:
+                parser.error(str(e))
+    if settings.auto_variant and settings.renditions:
+        parser.error(AUTO_VARIANT_WITH_RENDITIONS)
+    failed = []
+    results = []
+
+    def on_error(file_name, error_msg):
+        failed.append(file_name)
+        print(f"Не удалось обработать {file_name}: {error_msg}", file=sys.stderr)
+
+    cancel = threading.Event()
+    files = iter_media_files(args.inputs)
+    journal = None if args.no_journal else args.inputs
+    if args.watch:
+        from watermark_watch import watch_media_files
+        if not all(p.is_dir() for p in args.inputs):
+            parser.error("--watch: входы должны быть папками")
+        if any(p.resolve() == args.output.resolve() for p in args.inputs):
+            parser.error("--watch: папка результатов не должна совпадать с входной")
+
+        def stop(signum, frame):
+            # первый Ctrl+C — дописать начатые файлы и выйти, второй — прервать сразу
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            print("Останавливаю наблюдение… начатые файлы будут дописаны", file=sys.stderr, flush=True)
+            cancel.set()
+
+        signal.signal(signal.SIGINT, stop)
+        files = watch_media_files(args.inputs, cancel, exclude=[args.output], interval=args.watch_interval)
+        # партия без конца: продолжать нечего, повторы отсекает манифест
+        journal = None
+        print(f"Наблюдение за {', '.join(map(str, args.inputs))}, Ctrl+C — остановить", flush=True)
+    total_files = run_batch(files, settings, max(1, args.workers),
+                            progress=lambda done, text: print(text, flush=True), error=on_error,
+                            manifest=not args.no_manifest, force=args.force,
+                            report=False if args.no_report else (args.report or True), summary=results.append,
+                            cancel=cancel, journal=journal, resume=args.resume,
+                            memory_budget=max(0, args.memory_budget) * 2**20, dedup=not args.no_dedup,
+                            checkpoint_frames=max(0, args.checkpoint_frames))
+    if args.watch:
+        print(f"Наблюдение остановлено: обработано {total_files - len(failed)} из {total_files}")
+        return 1 if failed else 0
+    if not total_files:
+        print("Нет подходящих файлов для обработки", file=sys.stderr)
+        return 1
+    print(f"Готово: {total_files - len(failed)} из {total_files}, файлы сохранены в {args.output}")
+    if results:
+        result = results[0]
+        print(f"{result['wall_seconds']} с, {result['files_per_second']} файлов/с, {result['mb_per_second']} МБ/с")
+        if result.get("duplicates"):
+            # у оригиналов из прежних партий время обработки неизвестно
+            saved = result["dedup_saved_seconds"]
+            saved = f", сэкономлено ~{saved} с обработки" if saved else ""
+            print(f"Копий без повторной обработки: {result['duplicates']}{saved}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
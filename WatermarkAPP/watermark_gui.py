@@ -0,0 +1,933 @@
+"""Окно приложения на PyQt5. Запускается из watermark_app.py (main)."""
+import time
+import sys
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+from PyQt5.QtWidgets import (
+    QApplication, QWidget, QVBoxLayout, QLabel, QPushButton,
+    QProgressBar, QSlider, QHBoxLayout, QFileDialog, QComboBox, QMessageBox,
+    QSpinBox, QListWidget, QListWidgetItem, QCheckBox
+)
+from PyQt5.QtCore import Qt, QSettings, QThread, QTimer, pyqtSignal, QFileSystemWatcher
+from PyQt5.QtGui import QDragEnterEvent, QDropEvent, QPixmap, QImage, QIcon
+from watermark_engine import (
+    AUTO_VARIANT_WITH_RENDITIONS, DEFAULT_ENCODER, ENCODER_PROFILES, VIDEO_EXTENSIONS, PreparedLogoCache,
+    PreviewRenderer, WatermarkSettings, iter_media_files, load_renditions, output_file_name, preload_module,
+    reserve_output_path, run_batch, settings_from_dict, watermark_file, watermark_image, watermark_video,
+)
+from watermark_jobs import unfinished_batch
+from watermark_watch import watch_media_files
+from watermark_thumbnails import ThumbnailCache, ThumbnailLoader, scan_logo_dir
+_IMPORTED = time.perf_counter()
+
+# путь к JSONL: дописать замер старта и закрыть окно после первой отрисовки
+STARTUP_PROBE_ENV = "WATERMARK_STARTUP_PROBE"
+
+class ProcessingThread(QThread):
+    progress = pyqtSignal(int, str)
+    total_changed = pyqtSignal(int)
+    finished = pyqtSignal(int)
+    error = pyqtSignal(str, str)
+
+    def __init__(self, paths, app, settings=None, resume=False, watch=False):
+        super().__init__()
+        self.paths = paths
+        self.app = app
+        # снимок настроек берём в GUI-потоке: во время обработки виджет может меняться;
+        # при продолжении партии настройки берутся из журнала
+        self.settings = settings or app.current_settings()
+        self.resume = resume
+        # watch — следить за папками paths, пока не отменят
+        self.watch = watch
+        self.workers = max(1, int(app.workers))
+        self.memory_budget = int(app.memory_budget_mb) * 2**20
+        self.cancel_event = threading.Event()
+        self.pause_event = threading.Event()
+        self.wake_event = threading.Event()  # внеочередной опрос папок при наблюдении
+
+    def cancel(self):
+        self.pause_event.clear()
+        self.cancel_event.set()
+
+    def toggle_pause(self):
+        """Пауза: начатые файлы дописываются, новые не берутся. Возвращает True, если на паузе."""
+        if self.pause_event.is_set():
+            self.pause_event.clear()
+        else:
+            self.pause_event.set()
+        return self.pause_event.is_set()
+
+    def run(self):
+        # папки обходятся по ходу обработки, total_changed растёт вместе с обходом
+        total_files = 0
+        files = iter_media_files(self.paths, self.cancel_event)
+        journal = self.paths
+        if self.watch:
+            files = watch_media_files(self.paths, self.cancel_event, exclude=[self.settings.output_folder],
+                                      wake=self.wake_event)
+            # у наблюдения нет конца — продолжать нечего, повторы отсекает манифест
+            journal = None
+        try:
+            total_files = run_batch(files, self.settings, self.workers,
+                                    self.app.logo_cache, progress=self.progress.emit, error=self.error.emit,
+                                    total=self.total_changed.emit, cancel=self.cancel_event,
+                                    journal=journal, resume=self.resume, pause=self.pause_event,
+                                    memory_budget=self.memory_budget)
+        except Exception as e:
+            # например, упал пул процессов — окно не должно остаться в состоянии «идёт обработка»
+            logging.error(f"Ошибка обработки: {e}")
+            self.error.emit("партию", str(e))
+        self.finished.emit(total_files)
+
+class PreviewThread(QThread):
+    """Рисует превью в фоне. Из накопившихся запросов берётся только последний."""
+    ready = pyqtSignal(QImage)
+    failed = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.renderer = PreviewRenderer()
+        self._condition = threading.Condition()
+        self._request = None
+        self._stopped = False
+
+    def request(self, path, settings):
+        with self._condition:
+            self._request = (path, settings)
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                path, settings = self._request
+                self._request = None
+            try:
+                if Path(path).is_dir():
+                    # для папки в очереди — первый найденный файл
+                    path = next(iter_media_files([path]), None)
+                    if path is None:
+                        self.failed.emit("В папке нет изображений и видео")
+                        continue
+                image = self.renderer.render(path, settings).convert("RGB")
+                data = image.tobytes()
+                qimg = QImage(data, image.width, image.height, image.width * 3, QImage.Format_RGB888)
+                self.ready.emit(qimg.copy())
+            except Exception as e:
+                logging.error(f"Ошибка превью {path}: {e}")
+                self.failed.emit(str(e))
+
+class WatermarkApp(QWidget):
+    def __init__(self, started=None):
+        super().__init__()
+        self.started = _IMPORTED if started is None else started  # perf_counter() запуска — для замера старта
+        self.logo_path = None
+        self.logo = None
+        self.logo_dir = Path(__file__).parent / "Logo"
+        self.default_output_folder = Path(__file__).parent / "output"
+        self.default_output_folder.mkdir(exist_ok=True)
+        self.output_folder = self.default_output_folder
+        self.logo_scale = 0.2
+        self.logo_alpha = 1.0
+        self.available_logos = []
+        self._saved_logo_name = None
+        self.thumbnail_cache = ThumbnailCache()
+        self._logo_icons = {}  # путь -> (ключ миниатюры, QIcon)
+        self._logo_keys = {}  # путь -> ключ миниатюры на момент последнего сканирования
+        self._thumbnail_loaders = []
+        self.logo_position = 'center_top'  # options: center_top, center_bottom, top_left, top_right, bottom_left, bottom_right
+        self.offset_x = 20
+        self.offset_y = 20
+        self.workers = 1  # >1 — изображения обрабатываются пулом процессов
+        self.renditions_path = None
+        self.renditions = ()
+        self.auto_variant = False
+        self.encoder = DEFAULT_ENCODER  # профиль кодирования результатов
+        self.memory_budget_mb = 0  # память на файлы в работе у пула; 0 — без ограничения
+        self.files_to_process = []
+        self.logo_cache = PreparedLogoCache()
+        self.preview_thread = PreviewThread()
+        self._first_paint_done = False
+        self.settings = QSettings("ArtemEdition", "WatermarkApp")
+        self.load_settings()
+        self.init_ui()
+
+    def init_ui(self):
+        # превью перерисовывается не чаще ~60 раз в секунду, пока двигают ползунок
+        self._preview_timer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(16)
+        self._preview_timer.timeout.connect(self.request_preview)
+        # настройки пишутся в QSettings после паузы, а не на каждое деление ползунка
+        self._save_timer = QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(500)
+        self._save_timer.timeout.connect(self.save_settings)
+        self.preview_thread.ready.connect(self.show_preview)
+        self.preview_thread.failed.connect(lambda message: self.preview_label.setText("Ошибка превью"))
+        self.preview_thread.start()
+
+        self.setWindowTitle("Watermark Auto — Criga Edition")
+        self.setGeometry(400, 200, 500, 500)
+        self.setAcceptDrops(True)
+
+        self.setStyleSheet("""
+            QWidget { font-size: 14px; }
+            QPushButton { padding: 10px; background-color: #4CAF50; color: white; border-radius: 5px; }
+            QPushButton:hover { background-color: #45a049; }
+            QPushButton:disabled { background-color: #cccccc; }
+            QLabel { font-size: 16px; }
+            QProgressBar { height: 20px; }
+            QComboBox { padding: 5px; background-color: white; }
+        """)
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.info_label = QLabel("Перетащи файлы или папку сюда 👇")
+        self.info_label.setAlignment(Qt.AlignCenter)
+        self.info_label.setStyleSheet("border: 2px dashed #aaa; padding: 20px;")
+
+        self.logo_label = QLabel("Логотип: не выбран")
+        self.logo_label.setAlignment(Qt.AlignCenter)
+
+        # ComboBox для выбора логотипа
+        logo_layout = QHBoxLayout()
+        logo_select_label = QLabel("Выбери логотип:")
+        logo_select_label.setStyleSheet("background-color: white; padding: 5px;")
+        self.logo_combo = QComboBox()
+        self.logo_combo.currentIndexChanged.connect(self.load_predefined_logo)
+        # Кнопка для обновления списка логотипов
+        self.btn_refresh_logos = QPushButton("Обновить")
+        self.btn_refresh_logos.clicked.connect(self.refresh_logo_list)
+        # Кнопка для выбора логотипа из любой папки
+        self.btn_choose_logo = QPushButton("Выбрать файл...")
+        self.btn_choose_logo.clicked.connect(self.choose_logo_file)
+        logo_layout.addWidget(logo_select_label)
+        logo_layout.addWidget(self.logo_combo)
+        logo_layout.addWidget(self.btn_refresh_logos)
+        logo_layout.addWidget(self.btn_choose_logo)
+
+        # Превью логотипа (больше и контрастнее)
+        self.preview_label = QLabel("Превью логотипа")
+        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label.setFixedSize(200, 200)
+        self.preview_label.setStyleSheet("border: 1px solid #ddd; background: #fff;")
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setAlignment(Qt.AlignCenter)
+        self.progress_bar.setVisible(False)
+        self.progress_bar.setTextVisible(True)
+
+        btn_output = QPushButton("Выбрать папку для сохранения")
+        btn_output.clicked.connect(self.select_output_folder)
+
+        # Версии результата (JSON): каждый файл декодируется один раз и пишется во все версии
+        self.btn_renditions = QPushButton()
+        self.btn_renditions.clicked.connect(self.select_renditions)
+        self.update_renditions_button()
+
+        # Очередь файлов (список) для обработки
+        queue_layout = QHBoxLayout()
+        self.queue_list = QListWidget()
+        self.queue_list.setFixedHeight(120)
+        btn_remove = QPushButton("Удалить выбранные")
+        btn_remove.clicked.connect(self.remove_selected_from_queue)
+        self.queue_list.currentItemChanged.connect(lambda current, previous: self.update_preview())
+        queue_layout.addWidget(self.queue_list)
+        queue_layout.addWidget(btn_remove)
+
+        # Параметры позиции логотипа
+        pos_layout = QHBoxLayout()
+        pos_label = QLabel("Позиция:")
+        self.pos_combo = QComboBox()
+        # отображаемые тексты и реальные значения
+        pos_items = [("По центру сверху", 'center_top'), ("По центру снизу", 'center_bottom'),
+                     ("Верхний левый", 'top_left'), ("Верхний правый", 'top_right'),
+                     ("Нижний левый", 'bottom_left'), ("Нижний правый", 'bottom_right')]
+        for text, val in pos_items:
+            self.pos_combo.addItem(text, val)
+        # выбрать сохранённое значение
+        try:
+            idx = next(i for i in range(self.pos_combo.count()) if self.pos_combo.itemData(i) == self.logo_position)
+        except Exception:
+            idx = 0
+        self.pos_combo.setCurrentIndex(idx)
+        self.pos_combo.currentIndexChanged.connect(lambda i: setattr(self, 'logo_position', self.pos_combo.itemData(i)) or self.on_setting_changed())
+        offset_label_x = QLabel("Отступ X:")
+        self.offset_x_spin = QSpinBox()
+        self.offset_x_spin.setRange(0, 2000)
+        self.offset_x_spin.setValue(int(self.offset_x))
+        self.offset_x_spin.valueChanged.connect(lambda v: setattr(self, 'offset_x', v) or self.on_setting_changed())
+        offset_label_y = QLabel("Y:")
+        self.offset_y_spin = QSpinBox()
+        self.offset_y_spin.setRange(0, 2000)
+        self.offset_y_spin.setValue(int(self.offset_y))
+        self.offset_y_spin.valueChanged.connect(lambda v: setattr(self, 'offset_y', v) or self.on_setting_changed())
+        pos_layout.addWidget(pos_label)
+        pos_layout.addWidget(self.pos_combo)
+        pos_layout.addWidget(offset_label_x)
+        pos_layout.addWidget(self.offset_x_spin)
+        pos_layout.addWidget(offset_label_y)
+        pos_layout.addWidget(self.offset_y_spin)
+
+        # Ползунок масштаба
+        scale_layout = QHBoxLayout()
+        scale_label = QLabel(f"Масштаб логотипа: {int(self.logo_scale*100)}%")
+        self.scale_slider = QSlider(Qt.Horizontal)
+        self.scale_slider.setMinimum(10)
+        self.scale_slider.setMaximum(100)
+        self.scale_slider.setValue(int(self.logo_scale*100))
+        self.scale_slider.valueChanged.connect(lambda val: self.update_scale(val, scale_label))
+        scale_layout.addWidget(scale_label)
+        scale_layout.addWidget(self.scale_slider)
+
+        # Ползунок прозрачности
+        alpha_layout = QHBoxLayout()
+        alpha_label = QLabel(f"Прозрачность логотипа: {int(self.logo_alpha*100)}%")
+        self.alpha_slider = QSlider(Qt.Horizontal)
+        self.alpha_slider.setMinimum(0)
+        self.alpha_slider.setMaximum(100)
+        self.alpha_slider.setValue(int(self.logo_alpha*100))
+        self.alpha_slider.valueChanged.connect(lambda val: self.update_alpha(val, alpha_label))
+        alpha_layout.addWidget(alpha_label)
+        alpha_layout.addWidget(self.alpha_slider)
+
+        # Автовыбор варианта логотипа (обычный / _inverted / _mono) по контрасту с фоном
+        self.auto_variant_check = QCheckBox("Подбирать вариант логотипа под фон")
+        self.auto_variant_check.setChecked(self.auto_variant)
+        self.auto_variant_check.toggled.connect(lambda v: setattr(self, 'auto_variant', v) or self.on_setting_changed())
+
+        # Количество процессов для обработки
+        workers_layout = QHBoxLayout()
+        workers_label = QLabel("Процессов:")
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, os.cpu_count() or 1)
+        self.workers_spin.setValue(int(self.workers))
+        self.workers_spin.valueChanged.connect(lambda v: setattr(self, 'workers', v) or self._save_timer.start())
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.workers_spin)
+        encoder_label = QLabel("Кодирование:")
+        self.encoder_combo = QComboBox()
+        encoder_items = [("Быстрое", 'fast'), ("Обычное", 'balanced'), ("Архивное", 'archival'), ("WebP", 'web')]
+        for text, val in encoder_items:
+            self.encoder_combo.addItem(text, val)
+        idx = self.encoder_combo.findData(self.encoder)
+        self.encoder_combo.setCurrentIndex(idx if idx >= 0 else self.encoder_combo.findData(DEFAULT_ENCODER))
+        self.encoder_combo.currentIndexChanged.connect(
+            lambda i: setattr(self, 'encoder', self.encoder_combo.itemData(i)) or self._save_timer.start())
+        workers_layout.addWidget(encoder_label)
+        workers_layout.addWidget(self.encoder_combo)
+        memory_label = QLabel("Память, МБ:")
+        self.memory_spin = QSpinBox()
+        self.memory_spin.setRange(0, 1024 * 1024)
+        self.memory_spin.setSingleStep(512)
+        self.memory_spin.setSpecialValueText("без ограничения")
+        self.memory_spin.setToolTip("Сколько памяти могут занимать файлы, которые пул обрабатывает одновременно")
+        self.memory_spin.setValue(int(self.memory_budget_mb))
+        self.memory_spin.valueChanged.connect(lambda v: setattr(self, 'memory_budget_mb', v) or self._save_timer.start())
+        workers_layout.addWidget(memory_label)
+        workers_layout.addWidget(self.memory_spin)
+
+        self.btn_start = QPushButton("Начать обработку")
+        self.btn_start.clicked.connect(self.start_processing)
+        self.btn_start.setEnabled(False)
+
+        self.btn_pause = QPushButton("Пауза")
+        self.btn_pause.clicked.connect(self.toggle_pause)
+        self.btn_pause.setVisible(False)
+
+        self.btn_cancel = QPushButton("Отмена")
+        self.btn_cancel.clicked.connect(self.cancel_processing)
+        self.btn_cancel.setVisible(False)
+
+        # горячая папка: новые файлы обрабатываются, как только дописаны
+        self.btn_watch = QPushButton("Следить за папкой…")
+        self.btn_watch.clicked.connect(self.toggle_watch)
+        self.input_watcher = None
+
+        # прерванная партия из журнала в папке результатов (закрыли окно, сбой)
+        self.btn_resume = QPushButton("Продолжить прерванную партию")
+        self.btn_resume.clicked.connect(self.resume_processing)
+        self.btn_resume.setVisible(False)
+
+        layout.addWidget(self.logo_label)
+        layout.addLayout(logo_layout)
+        layout.addWidget(self.preview_label)
+        layout.addWidget(btn_output)
+        layout.addWidget(self.btn_renditions)
+        layout.addLayout(queue_layout)
+        layout.addLayout(scale_layout)
+        layout.addLayout(alpha_layout)
+        layout.addWidget(self.auto_variant_check)
+        layout.addLayout(workers_layout)
+        layout.addWidget(self.btn_start)
+        layout.addWidget(self.btn_watch)
+        layout.addWidget(self.btn_resume)
+        layout.addWidget(self.btn_pause)
+        layout.addWidget(self.btn_cancel)
+        layout.addWidget(self.info_label)
+        layout.addWidget(self.progress_bar)
+
+        # Заполнить список логотипов из папки Logo и попытаться восстановить выбор
+        # Наблюдатель папки Logo для авто-обновления
+        if not self.logo_dir.exists():
+            try:
+                self.logo_dir.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                logging.error(f"Не удалось создать папку Logo: {e}")
+        # копирование пачки файлов даёт серию событий — сканируем один раз после паузы
+        self._logo_rescan_timer = QTimer(self)
+        self._logo_rescan_timer.setSingleShot(True)
+        self._logo_rescan_timer.setInterval(300)
+        self._logo_rescan_timer.timeout.connect(self.refresh_logo_list)
+        self.watcher = QFileSystemWatcher()
+        try:
+            self.watcher.addPath(str(self.logo_dir))
+            self.watcher.directoryChanged.connect(self._logo_rescan_timer.start)
+        except Exception:
+            # некоторые окружения не поддерживают watcher на директорию; он не критичен
+            logging.info("QFileSystemWatcher: не удалось добавить наблюдение за папкой Logo")
+
+        self.refresh_logo_list()
+        # сохранённый логотип загружается после первой отрисовки (restore_saved_logo):
+        # окно появляется раньше, чем грузятся PIL и numpy
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._first_paint_done:
+            self._first_paint_done = True
+            self.report_startup_timing()
+            QTimer.singleShot(0, self.restore_saved_logo)
+
+    def report_startup_timing(self):
+        """Пишет в лог время импортов и первой отрисовки и какие тяжёлые модули уже загружены."""
+        now = time.perf_counter()
+        timing = {
+            "imports_ms": round((_IMPORTED - self.started) * 1000, 1),
+            "first_paint_ms": round((now - self.started) * 1000, 1),
+            "heavy_modules": [m for m in ("cv2", "numpy", "PIL.Image") if m in sys.modules],
+        }
+        logging.info(f"Запуск: импорт {timing['imports_ms']} мс, первая отрисовка {timing['first_paint_ms']} мс, "
+                     f"загружены: {', '.join(timing['heavy_modules']) or 'нет'}")
+        probe = os.environ.get(STARTUP_PROBE_ENV)
+        if probe:
+            with open(probe, "a", encoding="utf-8") as f:
+                f.write(json.dumps(timing) + "\n")
+            QTimer.singleShot(0, self.close)
+
+    def restore_saved_logo(self):
+        # Если есть сохранённое имя логотипа — выбрать его
+        if self._saved_logo_name:
+            idx = next((i for i, p in enumerate(self.available_logos) if p.name == self._saved_logo_name), None)
+            if idx is not None:
+                self.logo_combo.setCurrentIndex(idx)
+        # Если есть сохранённый путь и он валиден — загрузим логотип
+        if self.logo_path:
+            if Path(self.logo_path).exists():
+                self.load_logo_from_path(self.logo_path)
+            else:
+                # попробовать найти по имени в папке Logo
+                if self._saved_logo_name:
+                    alt = self.logo_dir / self._saved_logo_name
+                    if alt.exists():
+                        self.load_logo_from_path(str(alt))
+        # версии читаются с диска — тоже после первой отрисовки
+        if self.renditions_path:
+            self.load_renditions(self.renditions_path)
+            self.update_renditions_button()
+        self.check_unfinished_batch()
+
+    def load_predefined_logo(self, index):
+        # Загружает логотип по индексу из self.available_logos
+        if index == -1 or not getattr(self, 'available_logos', None):
+            return
+        if index < 0 or index >= len(self.available_logos):
+            return
+        path = self.available_logos[index]
+        if not path.exists():
+            self.info_label.setText(f"Логотип {path.name} не найден!")
+            logging.error(f"Логотип не найден: {path}")
+            return
+        self.load_logo_from_path(str(path))
+
+    def refresh_logo_list(self):
+        """Сканирует папку Logo и заполняет ComboBox списком доступных файлов.
+
+        Миниатюры берутся из памяти, а новые и изменённые файлы догружаются в
+        фоне (on_thumbnail_ready), так что сканирование не декодирует картинки.
+        """
+        self.available_logos = []
+        if not self.logo_dir.exists():
+            try:
+                self.logo_dir.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                logging.error(f"Не удалось создать папку Logo: {e}")
+                return
+        logos = scan_logo_dir(self.logo_dir)
+        self.available_logos = [p for p, _ in logos]
+        current_name = Path(self.logo_path).name if self.logo_path else None
+        icons = {}
+        to_load = []
+        for p, key in logos:
+            cached = self._logo_icons.get(str(p))
+            if cached is not None and cached[0] == key:
+                icons[str(p)] = cached
+            else:
+                to_load.append((p, key))
+        self._logo_icons = icons
+        self._logo_keys = {str(p): key for p, key in logos}
+        self.logo_combo.blockSignals(True)
+        self.logo_combo.clear()
+        if not self.available_logos:
+            self.logo_combo.addItem("(нет логотипов)")
+            self.logo_combo.setEnabled(False)
+        else:
+            for p in self.available_logos:
+                cached = icons.get(str(p))
+                self.logo_combo.addItem(cached[1] if cached else QIcon(), p.stem)
+            self.logo_combo.setEnabled(True)
+            # пересканирование не должно сбивать выбранный логотип
+            idx = next((i for i, p in enumerate(self.available_logos) if p.name == current_name), None)
+            if idx is not None:
+                self.logo_combo.setCurrentIndex(idx)
+        self.logo_combo.blockSignals(False)
+        for loader in self._thumbnail_loaders:
+            loader.requestInterruption()
+        if to_load:
+            loader = ThumbnailLoader(self.thumbnail_cache, to_load)
+            loader.thumbnail_ready.connect(self.on_thumbnail_ready)
+            loader.finished.connect(lambda loader=loader: self._thumbnail_loaders.remove(loader))
+            self._thumbnail_loaders.append(loader)
+            loader.start()
+
+    def on_thumbnail_ready(self, path, key, image):
+        """Ставит иконку, пришедшую из фонового потока, если файл с тех пор не менялся."""
+        if self._logo_keys.get(path) != key:
+            return
+        idx = self.available_logos.index(Path(path))
+        icon = QIcon(QPixmap.fromImage(image))
+        self._logo_icons[path] = (key, icon)
+        self.logo_combo.setItemIcon(idx, icon)
+
+    def load_logo_from_path(self, path):
+        self.logo_path = path
+        self.logo_label.setText(f"Логотип: {Path(path).name}")
+        try:
+            from PIL import Image
+            self.logo = Image.open(self.logo_path).convert("RGBA")
+            self.info_label.setText("Теперь перетащи файлы или папку для обработки")
+            self.save_settings()
+            self.update_preview()
+            self.btn_start.setEnabled(bool(self.files_to_process))
+            logging.info(f"Логотип загружен: {path}")
+        except Exception as e:
+            logging.error(f"Ошибка загрузки логотипа: {str(e)}")
+            self.info_label.setText(f"Ошибка загрузки логотипа: {str(e)}")
+            self.logo_path = None
+            self.logo = None
+            self.preview_label.clear()
+
+    def choose_logo_file(self):
+        file_filter = "Изображения (*.png *.jpg *.jpeg *.webp)"
+        fn, _ = QFileDialog.getOpenFileName(self, "Выбери файл логотипа", str(self.logo_dir), file_filter)
+        if fn:
+            self.load_logo_from_path(fn)
+
+    def remove_selected_from_queue(self):
+        items = self.queue_list.selectedItems()
+        for it in items:
+            path = it.data(Qt.UserRole)
+            try:
+                p = Path(path)
+                if p in self.files_to_process:
+                    self.files_to_process.remove(p)
+            except Exception:
+                pass
+            self.queue_list.takeItem(self.queue_list.row(it))
+
+    def update_preview(self):
+        """Превью на выбранном файле очереди (в фоне); без выбора — сам логотип."""
+        if self.logo and self.queue_list.currentItem() is not None:
+            if not self._preview_timer.isActive():
+                self._preview_timer.start()
+            return
+        if self.logo:
+            try:
+                img = self.logo.copy().convert("RGB")
+                data = img.tobytes()
+                qimg = QImage(data, img.width, img.height, img.width * 3, QImage.Format_RGB888)
+                self.show_preview(qimg)
+            except Exception as e:
+                logging.error(f"Ошибка отображения превью: {str(e)}")
+                self.preview_label.setText("Ошибка превью")
+
+    def request_preview(self):
+        item = self.queue_list.currentItem()
+        if self.logo_path and item is not None:
+            self.preview_thread.request(item.data(Qt.UserRole), self.current_settings())
+
+    def show_preview(self, qimg):
+        pixmap = QPixmap.fromImage(qimg)
+        w = self.preview_label.width()
+        h = self.preview_label.height()
+        self.preview_label.setPixmap(pixmap.scaled(w, h, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+
+    def on_setting_changed(self):
+        self._save_timer.start()
+        self.update_preview()
+
+    def update_scale(self, val, label):
+        self.logo_scale = val / 100
+        label.setText(f"Масштаб логотипа: {val}%")
+        self.on_setting_changed()
+
+    def update_alpha(self, val, label):
+        self.logo_alpha = val / 100
+        label.setText(f"Прозрачность логотипа: {val}%")
+        self.on_setting_changed()
+
+    def load_settings(self):
+        # Загружаем сохранённые настройки; сохраняем имя логотипа отдельно
+        self.logo_path = self.settings.value("logo_path", None)
+        self._saved_logo_name = self.settings.value("logo_name", None)
+        # позиция и отступы
+        self.logo_position = self.settings.value("logo_position", self.logo_position)
+        try:
+            self.offset_x = int(self.settings.value("offset_x", self.offset_x))
+            self.offset_y = int(self.settings.value("offset_y", self.offset_y))
+            self.workers = int(self.settings.value("workers", self.workers))
+            self.memory_budget_mb = int(self.settings.value("memory_budget_mb", self.memory_budget_mb))
+            self.auto_variant = self.settings.value("auto_variant", "false") in (True, "true")
+        except Exception:
+            pass
+        encoder = self.settings.value("encoder", self.encoder)
+        if encoder in ENCODER_PROFILES:
+            self.encoder = encoder
+        saved_output_folder = self.settings.value("output_folder", None)
+        if saved_output_folder and Path(saved_output_folder).exists():
+            self.output_folder = Path(saved_output_folder)
+        else:
+            self.output_folder = self.default_output_folder
+        self.logo_scale = float(self.settings.value("logo_scale", 0.2))
+        self.logo_alpha = float(self.settings.value("logo_alpha", 1.0))
+        self.renditions_path = self.settings.value("renditions_path", "") or None
+        # combo index восстановим после заполнения списка (если понадобится)
+        logging.info("Настройки загружены")
+
+    def save_settings(self):
+        self.settings.setValue("logo_path", self.logo_path if self.logo_path else "")
+        # сохраним имя логотипа (файл) для устойчивого восстановления
+        try:
+            if self.logo_path:
+                self.settings.setValue("logo_name", Path(self.logo_path).name)
+            else:
+                self.settings.setValue("logo_name", "")
+        except Exception:
+            pass
+        self.settings.setValue("output_folder", str(self.output_folder))
+        self.settings.setValue("logo_scale", self.logo_scale)
+        self.settings.setValue("logo_alpha", self.logo_alpha)
+        # позиция логотипа и отступы
+        try:
+            self.settings.setValue("logo_position", self.logo_position)
+            self.settings.setValue("offset_x", int(self.offset_x))
+            self.settings.setValue("offset_y", int(self.offset_y))
+            self.settings.setValue("workers", int(self.workers))
+            self.settings.setValue("memory_budget_mb", int(self.memory_budget_mb))
+            self.settings.setValue("auto_variant", bool(self.auto_variant))
+            self.settings.setValue("encoder", self.encoder)
+        except Exception:
+            pass
+        self.settings.setValue("renditions_path", self.renditions_path or "")
+        if hasattr(self, 'logo_combo'):
+            self.settings.setValue("logo_combo_index", self.logo_combo.currentIndex())
+        logging.info("Настройки сохранены")
+
+    def select_output_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Выбери папку для сохранения")
+        if folder:
+            self.output_folder = Path(folder)
+            self.output_folder.mkdir(exist_ok=True)
+            self.info_label.setText(f"Папка для сохранения: {self.output_folder}")
+            self.check_unfinished_batch()
+            self.save_settings()
+            logging.info(f"Папка для сохранения изменена: {folder}")
+        else:
+            self.output_folder = self.default_output_folder
+            self.info_label.setText(f"Папка для сохранения: {self.output_folder}")
+            self.save_settings()
+            logging.info(f"Папка для сохранения сброшена на значение по умолчанию: {self.default_output_folder}")
+
+    def select_renditions(self):
+        fn, _ = QFileDialog.getOpenFileName(self, "Выбери спецификацию версий", "", "JSON (*.json)")
+        if fn:
+            if not self.load_renditions(fn):
+                return
+        else:
+            # отмена выбора — обычный режим с одним результатом
+            self.renditions_path = None
+            self.renditions = ()
+            logging.info("Версии отключены")
+        self.update_renditions_button()
+        self.save_settings()
+
+    def load_renditions(self, path):
+        try:
+            self.renditions = load_renditions(path, self.current_settings()._replace(renditions=()))
+        except ValueError as e:
+            logging.error(f"Ошибка спецификации версий: {e}")
+            self.info_label.setText(str(e))
+            self.renditions_path = None
+            self.renditions = ()
+            return False
+        self.renditions_path = path
+        logging.info(f"Версии загружены: {path} ({len(self.renditions)})")
+        return True
+
+    def update_renditions_button(self):
+        if self.renditions:
+            names = ", ".join(r.name for r in self.renditions)
+            self.btn_renditions.setText(f"Версии: {names}")
+        else:
+            self.btn_renditions.setText("Версии: один результат (выбрать JSON...)")
+        if hasattr(self, 'auto_variant_check'):
+            self.auto_variant_check.setEnabled(not self.renditions)
+            self.auto_variant_check.setToolTip(AUTO_VARIANT_WITH_RENDITIONS if self.renditions else "")
+
+    def is_processing(self):
+        # self.thread до первого запуска — метод QObject.thread(), а не поток обработки
+        return isinstance(self.thread, ProcessingThread) and self.thread.isRunning()
+
+    def start_processing(self):
+        if self.is_processing():
+            self.info_label.setText("Дождись окончания текущей обработки")
+            return
+        if not self.logo:
+            self.info_label.setText("Сначала выбери логотип!")
+            return
+        if not self.files_to_process:
+            self.info_label.setText("Нет файлов для обработки!")
+            return
+        # очередь очищается только после завершения: прерванную партию можно продолжить
+        self.process_paths(list(self.files_to_process))
+        self.btn_start.setEnabled(False)
+
+    def check_unfinished_batch(self):
+        """Показывает кнопку продолжения, если в папке результатов есть прерванная партия."""
+        try:
+            unfinished = unfinished_batch(self.output_folder)
+        except Exception as e:
+            logging.error(f"Не удалось прочитать журнал заданий: {e}")
+            unfinished = None
+        self.btn_resume.setVisible(unfinished is not None and not self.is_processing())
+        if unfinished is not None:
+            inputs, _, done = unfinished
+            self.btn_resume.setText(f"Продолжить прерванную партию ({len(inputs)} источн., готово {done})")
+        return unfinished
+
+    def toggle_watch(self):
+        if self.is_processing():
+            if self.thread.watch:
+                self.cancel_processing()
+            else:
+                self.info_label.setText("Дождись окончания текущей обработки")
+            return
+        if not self.logo:
+            self.info_label.setText("Сначала выбери логотип!")
+            return
+        folder = QFileDialog.getExistingDirectory(self, "Папка, за которой следить")
+        if not folder:
+            return
+        if Path(folder).resolve() == Path(self.output_folder).resolve():
+            self.info_label.setText("Папка наблюдения не должна совпадать с папкой результатов")
+            return
+        self.start_watch(Path(folder))
+
+    def start_watch(self, folder: Path):
+        self.process_files([folder], watch=True)
+        # QFileSystemWatcher сокращает задержку; сетевые папки он видит не всегда — там опрос
+        self.input_watcher = QFileSystemWatcher([str(folder)])
+        self.input_watcher.directoryChanged.connect(lambda _: self.thread.wake_event.set())
+        self.btn_watch.setText(f"Остановить наблюдение за {folder.name}")
+        self.btn_start.setEnabled(False)
+        self.info_label.setText(f"Слежу за {folder}: новые файлы обрабатываются, как только дописаны")
+        logging.info(f"Наблюдение за папкой: {folder}")
+
+    def resume_processing(self):
+        if self.is_processing():
+            return
+        unfinished = self.check_unfinished_batch()
+        if unfinished is None:
+            self.info_label.setText("Прерванной партии нет")
+            return
+        inputs, fields, done = unfinished
+        try:
+            settings = settings_from_dict(fields)
+        except Exception as e:
+            logging.error(f"Не удалось восстановить настройки партии: {e}")
+            self.info_label.setText(f"Не удалось продолжить партию: {e}")
+            return
+        if settings.auto_variant and settings.renditions:
+            self.info_label.setText(f"Не удалось продолжить партию: {AUTO_VARIANT_WITH_RENDITIONS}")
+            return
+        logging.info(f"Продолжение партии: готово {done}, входы: {inputs}")
+        self.btn_resume.setVisible(False)
+        self.btn_start.setEnabled(False)
+        self.process_files([Path(p) for p in inputs], settings=settings, resume=True)
+
+    def closeEvent(self, event):
+        # QThread нельзя уничтожать на ходу; миниатюры дождёмся после прерывания
+        for loader in list(self._thumbnail_loaders):
+            loader.requestInterruption()
+            loader.wait()
+        self.preview_thread.stop()
+        if self.is_processing() and self.thread.watch:
+            # наблюдение само не закончится: останавливаем и дожидаемся начатых файлов
+            self.thread.cancel()
+            self.thread.wait()
+        if self._save_timer.isActive():
+            self._save_timer.stop()
+            self.save_settings()
+        super().closeEvent(event)
+
+    def dragEnterEvent(self, event: QDragEnterEvent):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+
+    def dropEvent(self, event: QDropEvent):
+        if not self.logo:
+            self.info_label.setText("Сначала выбери логотип!")
+            logging.warning("Попытка обработки без логотипа")
+            return
+        paths = [Path(url.toLocalFile()) for url in event.mimeData().urls()]
+        if any(p.suffix.lower() in VIDEO_EXTENSIONS for p in paths):
+            # OpenCV нужен только для видео — грузим его, пока пользователь не нажал «Начать»
+            preload_module("cv2")
+        for p in paths:
+            self.files_to_process.append(p)
+            try:
+                item = QListWidgetItem(p.name)
+                item.setData(Qt.UserRole, str(p))
+                self.queue_list.addItem(item)
+            except Exception:
+                pass
+        self.info_label.setText(f"Добавлено {len(paths)} элементов для обработки")
+        self.btn_start.setEnabled(True)
+
+    def process_paths(self, paths):
+        # папки обходит поток обработки, файлы идут в работу по мере нахождения
+        self.process_files(paths)
+
+    def process_files(self, files, settings=None, resume=False, watch=False):
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setMaximum(0)  # пока идёт обход — индикатор без шкалы
+        self.progress_bar.setValue(0)
+        self.btn_cancel.setEnabled(True)
+        self.btn_cancel.setVisible(True)
+        self.btn_pause.setText("Пауза")
+        self.btn_pause.setVisible(True)
+        self.btn_resume.setVisible(False)
+        self.thread = ProcessingThread(files, self, settings, resume, watch)
+        self.thread.progress.connect(self.update_progress)
+        self.thread.total_changed.connect(self.progress_bar.setMaximum)
+        self.thread.finished.connect(self.on_processing_finished)
+        self.thread.error.connect(self.show_error)
+        self.thread.start()
+
+    def cancel_processing(self):
+        if self.is_processing():
+            self.thread.cancel()
+            self.btn_cancel.setEnabled(False)
+            self.btn_pause.setVisible(False)
+            self.info_label.setText("Останавливаю… начатые файлы будут дописаны")
+
+    def toggle_pause(self):
+        if self.is_processing():
+            if self.thread.toggle_pause():
+                self.btn_pause.setText("Продолжить")
+                self.info_label.setText("Пауза: начатые файлы дописываются, новые не берутся")
+            else:
+                self.btn_pause.setText("Пауза")
+                self.info_label.setText("Обработка продолжается")
+
+    def update_progress(self, value, text):
+        self.progress_bar.setValue(value)
+        self.info_label.setText(text)
+        QApplication.processEvents()
+
+    def on_processing_finished(self, total_files):
+        self.progress_bar.setVisible(False)
+        self.btn_cancel.setVisible(False)
+        self.btn_pause.setVisible(False)
+        output_folder = self.thread.settings.output_folder
+        if self.thread.watch:
+            self.input_watcher = None
+            self.btn_watch.setText("Следить за папкой…")
+            self.info_label.setText(f"Наблюдение остановлено: обработано {total_files}, файлы в {output_folder}")
+            logging.info(f"Наблюдение остановлено, обработано {total_files} файлов")
+        elif total_files == 0:
+            self.info_label.setText("Нет подходящих файлов для обработки")
+            logging.info("Нет подходящих файлов для обработки")
+        elif self.thread.cancel_event.is_set():
+            self.info_label.setText(f"Остановлено. Обработанные файлы сохранены в {output_folder}")
+            logging.info("Обработка остановлена пользователем")
+        else:
+            self.info_label.setText(f"✅ Готово! Файлы сохранены в {output_folder}")
+        if not self.thread.cancel_event.is_set() and not self.thread.resume and not self.thread.watch:
+            # партия из очереди завершена — повторно её не запускаем
+            self.files_to_process = []
+        logging.info(f"Обработано {total_files} файлов")
+        stats = self.logo_cache.stats()
+        logging.info(f"Кэш логотипов: попаданий {stats['hits']}, промахов {stats['misses']}")
+        self.btn_start.setEnabled(bool(self.logo and self.files_to_process))
+        self.check_unfinished_batch()
+
+    def show_error(self, file_name, error_msg):
+        QMessageBox.critical(self, "Ошибка", f"Не удалось обработать {file_name}: {error_msg}")
+
+    def get_unique_output_path(self, output_path: Path):
+        return reserve_output_path(output_path)
+
+    def current_settings(self):
+        return WatermarkSettings(
+            logo_path=str(self.logo_path), logo_scale=float(self.logo_scale), logo_alpha=float(self.logo_alpha),
+            logo_position=self.logo_position, offset_x=int(self.offset_x), offset_y=int(self.offset_y),
+            output_folder=Path(self.output_folder), renditions=self.renditions,
+            # с версиями флажок выключен (update_renditions_button): логотип версии задаёт спецификация
+            auto_variant=bool(self.auto_variant) and not self.renditions, encoder=self.encoder,
+        )
+
+    def process_file(self, file_path: Path):
+        settings = self.current_settings()
+        output_file = self.get_unique_output_path(self.output_folder / output_file_name(file_path, settings))
+        watermark_file(file_path, output_file, settings, self.logo_cache)
+
+    def add_watermark_image(self, image_path, output_path):
+        watermark_image(image_path, output_path, self.current_settings(), self.logo_cache)
+
+    def add_watermark_video(self, video_path, output_path):
+        watermark_video(video_path, output_path, self.current_settings(), self.logo_cache)
+
+def main(started=None):
+    """Лог и окно; started — perf_counter() до первых импортов процесса."""
+    logging.basicConfig(
+        filename='watermark_app.log', level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s', encoding='utf-8'
+    )
+    app = QApplication(sys.argv)
+    window = WatermarkApp(started)
+    window.show()
+    sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""Журнал заданий партии: продолжение после закрытия окна или сбоя.
+
+SQLite в папке результатов. Для партии хранятся входы и настройки, для
+каждого файла — состояние (pending, in_progress, done, failed) и выбранный
+путь результата, для длинных видео — готовые сегменты. Прерванная партия
+продолжается с того же места: готовые файлы не пересчитываются, у видео
+пересчитываются только недописанные сегменты.
+"""
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+JOURNAL_NAME = ".watermark_jobs.sqlite"
+PENDING, IN_PROGRESS, DONE, FAILED = "pending", "in_progress", "done", "failed"
+BATCH_RUNNING, BATCH_STOPPED, BATCH_DONE = "running", "stopped", "done"
+
+
+def unfinished_batch(output_folder):
+    """(входы, настройки как dict, число готовых файлов) последней незавершённой партии или None."""
+    path = Path(output_folder) / JOURNAL_NAME
+    if not path.exists():
+        return None
+    journal = JobJournal(output_folder)
+    try:
+        return journal.unfinished()
+    finally:
+        journal.close()
+
+
+class JobJournal:
+    """Журнал заданий в папке результатов. Пишется только из одного потока."""
+
+    def __init__(self, output_folder):
+        self.path = Path(output_folder) / JOURNAL_NAME
+        self.batch_id = None
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS batches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                inputs TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                batch_id INTEGER NOT NULL,
+                input_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                output_path TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (batch_id, input_path)
+            );
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                batch_id INTEGER NOT NULL,
+                input_path TEXT NOT NULL,
+                segment INTEGER NOT NULL,
+                start INTEGER NOT NULL,
+                count INTEGER,
+                frames INTEGER NOT NULL,
+                PRIMARY KEY (batch_id, input_path, segment)
+            );
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _key(file_path):
+        return str(Path(file_path).resolve())
+
+    def _latest_unfinished(self):
+        return self._conn.execute(
+            "SELECT id, inputs, settings FROM batches WHERE status != ? ORDER BY id DESC LIMIT 1",
+            (BATCH_DONE,)).fetchone()
+
+    def unfinished(self):
+        row = self._latest_unfinished()
+        if row is None:
+            return None
+        done = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE batch_id = ? AND status = ?",
+                                  (row[0], DONE)).fetchone()[0]
+        return json.loads(row[1]), json.loads(row[2]), done
+
+    def open_batch(self, inputs, settings, resume=False):
+        """Начинает партию или (resume) продолжает последнюю незавершённую.
+
+        settings — dict настроек в JSON-виде. Входы записываются абсолютными
+        путями. Новая партия закрывает прежние незавершённые: продолжить можно
+        только последнюю.
+        """
+        now = time.time()
+        row = self._latest_unfinished() if resume else None
+        if row is not None:
+            self.batch_id = row[0]
+            self._conn.execute("UPDATE batches SET status = ?, updated_at = ? WHERE id = ?",
+                               (BATCH_RUNNING, now, self.batch_id))
+        else:
+            self._conn.execute("UPDATE batches SET status = ?, updated_at = ? WHERE status != ?",
+                               (BATCH_DONE, now, BATCH_DONE))
+            cursor = self._conn.execute(
+                "INSERT INTO batches (inputs, settings, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (json.dumps([self._key(p) for p in inputs], ensure_ascii=False), json.dumps(settings, ensure_ascii=False),
+                 BATCH_RUNNING, now, now))
+            self.batch_id = cursor.lastrowid
+        self._conn.commit()
+        return self.batch_id
+
+    def job(self, file_path):
+        """(состояние, путь результата) файла в текущей партии или (None, None)."""
+        row = self._conn.execute("SELECT status, output_path FROM jobs WHERE batch_id = ? AND input_path = ?",
+                                 (self.batch_id, self._key(file_path))).fetchone()
+        if row is None:
+            return None, None
+        return row[0], Path(row[1]) if row[1] else None
+
+    def mark(self, file_path, status, output_path=None, error=None):
+        """Записывает состояние файла. Готовые и упавшие фиксируются на диске сразу,
+        pending/in_progress — вместе со следующей фиксацией: их потеря лишь повторит файл."""
+        self._conn.execute(
+            "INSERT INTO jobs (batch_id, input_path, status, output_path, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (batch_id, input_path) DO UPDATE SET "
+            "status = excluded.status, output_path = COALESCE(excluded.output_path, output_path), "
+            "error = excluded.error, updated_at = excluded.updated_at",
+            (self.batch_id, self._key(file_path), status, str(output_path) if output_path else None, error,
+             time.time()))
+        if status in (DONE, FAILED):
+            self._conn.commit()
+
+    def checkpoints(self, file_path):
+        """Готовые сегменты видео: {номер: (start, count, кадров)}."""
+        rows = self._conn.execute(
+            "SELECT segment, start, count, frames FROM checkpoints WHERE batch_id = ? AND input_path = ?",
+            (self.batch_id, self._key(file_path))).fetchall()
+        return {segment: (start, count, frames) for segment, start, count, frames in rows}
+
+    def add_checkpoint(self, file_path, segment, start, count, frames):
+        self._conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?)",
+                           (self.batch_id, self._key(file_path), segment, start, count, frames))
+        self._conn.commit()
+
+    def clear_checkpoints(self, file_path):
+        self._conn.execute("DELETE FROM checkpoints WHERE batch_id = ? AND input_path = ?",
+                           (self.batch_id, self._key(file_path)))
+        self._conn.commit()
+
+    def close(self, status=None):
+        """Закрывает журнал; status — итог партии (BATCH_DONE или BATCH_STOPPED)."""
+        if status is not None and self.batch_id is not None:
+            self._conn.execute("UPDATE batches SET status = ?, updated_at = ? WHERE id = ?",
+                               (status, time.time(), self.batch_id))
+        self._conn.commit()
+        self._conn.close()
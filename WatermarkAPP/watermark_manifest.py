@@ -0,0 +1,159 @@
+"""Манифест обработанных файлов для инкрементальных перезапусков.
+
+Лежит в папке результатов (SQLite) и для каждого входного файла хранит размер,
+mtime, хэш содержимого, отпечаток настроек с логотипом и путь результата.
+Повторный запуск пропускает файлы, у которых не изменились ни исходник, ни
+настройки, а изменившиеся перезаписывает под прежним именем.
+"""
+import json
+import sqlite3
+import time
+import hashlib
+from pathlib import Path
+
+try:
+    import xxhash
+except ImportError:
+    # без xxhash — BLAKE2b из стандартной библиотеки, медленнее, но тоже потоком
+    xxhash = None
+
+MANIFEST_NAME = ".watermark_manifest.sqlite"
+_HASH_CHUNK = 1024 * 1024
+_COMMIT_EVERY = 200
+_COMMIT_SECONDS = 2.0  # и не реже: в режиме наблюдения файлы идут редко, а манифест должен переживать сбой
+
+
+XXH3_PREFIX = "xxh3:"
+
+
+def file_content_hash(path, like=None):
+    """Хэш содержимого файла (128 бит), читается потоком по 1 МБ.
+
+    С установленным xxhash — xxh3 с префиксом "xxh3:", иначе BLAKE2b.
+    like — ранее записанный хэш: считать тем же алгоритмом, чтобы их можно было сравнить
+    (xxh3 без установленного xxhash посчитать нельзя — BLAKE2b просто не совпадёт).
+    """
+    fast = xxhash is not None and (like is None or like.startswith(XXH3_PREFIX))
+    digest = xxhash.xxh3_128() if fast else hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return XXH3_PREFIX + digest.hexdigest() if fast else digest.hexdigest()
+
+
+def settings_fingerprint(settings, logo_variants=()):
+    """Отпечаток настроек обработки: все поля, кроме папки результатов, и содержимое логотипов.
+
+    logo_variants — файлы вариантов логотипа, из которых идёт автовыбор.
+    """
+    fields = settings._asdict()
+    fields.pop("output_folder", None)
+    # логотипы всегда через BLAKE2b: отпечаток не должен меняться от установки xxhash
+    fields["logo_path"] = file_content_hash(fields["logo_path"], like="")
+    # пустые версии, выключенный автовыбор и профиль по умолчанию в отпечаток не попадают,
+    # чтобы манифесты прежних запусков не сбрасывались
+    if fields.pop("auto_variant", False):
+        fields["auto_variant"] = [file_content_hash(path, like="") for path in logo_variants]
+    if fields.get("encoder") == "balanced":
+        fields.pop("encoder")
+    renditions = fields.pop("renditions", None)
+    if renditions:
+        fields["renditions"] = [dict(r._asdict(), logo_path=file_content_hash(r.logo_path, like=""))
+                                for r in renditions]
+    return hashlib.blake2b(json.dumps(fields, sort_keys=True, default=str).encode("utf-8"),
+                           digest_size=16).hexdigest()
+
+
+class ProcessedManifest:
+    """SQLite-манифест в папке результатов. Пишется только из одного потока."""
+
+    def __init__(self, output_folder):
+        self.path = Path(output_folder) / MANIFEST_NAME
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS processed (
+                input_path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                processed_at REAL NOT NULL
+            )""")
+        # поиск прежних результатов с тем же содержимым начинается с размера
+        self._conn.execute("CREATE INDEX IF NOT EXISTS processed_size ON processed (size)")
+        self._conn.commit()
+        self._pending = 0
+        self._committed = time.monotonic()
+
+    @staticmethod
+    def _key(file_path):
+        return str(Path(file_path).resolve())
+
+    def check(self, file_path, fingerprint, existing_names=None):
+        """Решает, нужно ли обрабатывать файл.
+
+        Возвращает (skip, previous_output): skip=True — исходник и настройки не
+        менялись и результат на месте; previous_output — прежний результат,
+        который надо перезаписать (или None для нового файла). existing_names —
+        имена файлов в папке результатов, чтобы не проверять exists() по одному.
+        """
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, content_hash, fingerprint, output_path FROM processed WHERE input_path = ?",
+            (self._key(file_path),)).fetchone()
+        if row is None:
+            return False, None
+        size, mtime_ns, content_hash, row_fingerprint, output_path = row
+        output_path = Path(output_path)
+        if existing_names is not None:
+            output_exists = output_path.name in existing_names
+        else:
+            output_exists = output_path.exists()
+        if row_fingerprint != fingerprint or not output_exists:
+            return False, output_path
+        st = Path(file_path).stat()
+        if st.st_size != size:
+            return False, output_path
+        if st.st_mtime_ns == mtime_ns:
+            return True, output_path
+        # файл «тронули», но размер тот же — сверяем содержимое
+        if file_content_hash(file_path, like=content_hash) == content_hash:
+            self._conn.execute("UPDATE processed SET mtime_ns = ? WHERE input_path = ?",
+                               (st.st_mtime_ns, self._key(file_path)))
+            self._maybe_commit()
+            return True, output_path
+        return False, output_path
+
+    def same_size(self, file_path, size, fingerprint):
+        """[(хэш, путь результата)] других входов того же размера, обработанных с теми же настройками."""
+        return [(content_hash, Path(output_path)) for content_hash, output_path in self._conn.execute(
+            "SELECT content_hash, output_path FROM processed WHERE size = ? AND fingerprint = ? AND input_path != ?",
+            (size, fingerprint, self._key(file_path)))]
+
+    def record(self, file_path, stat, content_hash, fingerprint, output_path):
+        """Записывает успешно обработанный файл; stat снят до обработки."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO processed VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self._key(file_path), stat.st_size, stat.st_mtime_ns, content_hash, fingerprint,
+             str(output_path), time.time()))
+        self._maybe_commit()
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= _COMMIT_EVERY or time.monotonic() - self._committed >= _COMMIT_SECONDS:
+            self.flush()
+
+    def flush(self):
+        """Фиксирует записанное на диске (партия простаивает или пора по времени)."""
+        if self._pending:
+            self._conn.commit()
+            self._pending = 0
+        self._committed = time.monotonic()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
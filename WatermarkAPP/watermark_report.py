@@ -0,0 +1,155 @@
+"""Замеры стадий обработки и JSONL-отчёт о партии.
+
+StageTimer копит время стадий одного файла (decode, logo_prepare, composite,
+encode, write) через time.perf_counter — это дёшево, замеры можно держать
+включёнными всегда. RunReport пишет строку на каждый файл и итоговую строку с
+p50/p95 по стадиям, МБ/с и файлами/с, чтобы по отчёту было видно, упёрлась ли
+медленная ночь в диск, декодирование или кодирование. Обход входных папок идёт
+один раз на партию в отдельном потоке, поэтому он не стадия файла, а поле
+discover_seconds итоговой строки.
+"""
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+STAGES = ("decode", "logo_prepare", "composite", "encode", "write")
+REPORT_NAME = "watermark_report.jsonl"
+_FLUSH_SECONDS = 2.0
+
+
+class StageTimer:
+    """Суммарное время по стадиям одного файла, в секундах."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+def percentile(values, q):
+    """Перцентиль по ближайшему рангу; None для пустого списка."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class RunReport:
+    """Отчёт о партии: строки по файлам по мере обработки и итог в конце.
+
+    path=None — только итоговая статистика в памяти, без файла.
+    """
+
+    def __init__(self, path=None, workers=1):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.workers = workers
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self._start = time.perf_counter()
+        self._stage_values = {name: [] for name in STAGES}
+        self.counts = {"ok": 0, "error": 0, "skipped": 0}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.video_frames = 0
+        self.video_seconds = 0.0
+        self.peak_rss = 0
+        self.duplicates = 0
+        self.saved_seconds = 0.0
+        self.discover_seconds = None
+        self.path = Path(path) if path else None
+        self._file = open(self.path, "a", encoding="utf-8") if self.path else None
+        self._flushed = time.monotonic()
+
+    def _write(self, record):
+        if self._file is not None:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if time.monotonic() - self._flushed >= _FLUSH_SECONDS:
+                self.flush()
+
+    def flush(self):
+        """Сбрасывает дописанные строки в файл, чтобы отчёт можно было читать во время партии."""
+        if self._file is not None:
+            self._file.flush()
+        self._flushed = time.monotonic()
+
+    def file_done(self, file_path, output_path, report):
+        self.counts["ok"] += 1
+        stages = report.get("stages", {})
+        for name, seconds in stages.items():
+            self._stage_values.setdefault(name, []).append(seconds)
+        self.bytes_in += report.get("bytes_in", 0)
+        self.bytes_out += report.get("bytes_out", 0)
+        self.peak_rss = max(self.peak_rss, report.get("peak_rss", 0))
+        record = {"type": "file", "run_id": self.run_id, "status": "ok", "input": str(file_path),
+                  "output": str(output_path)}
+        for key in ("kind", "seconds", "bytes_in", "bytes_out", "buffer_bytes", "memory_estimate", "peak_rss",
+                    "frames", "fps", "duplicate_of", "saved_seconds"):
+            if key in report:
+                record[key] = report[key]
+        record["stages"] = {name: round(seconds, 6) for name, seconds in stages.items()}
+        if "duplicate_of" in report:
+            self.duplicates += 1
+            self.saved_seconds += report.get("saved_seconds", 0.0)
+        if report.get("frames"):
+            self.video_frames += report["frames"]
+            self.video_seconds += report.get("seconds", 0.0)
+        self._write(record)
+
+    def file_failed(self, file_path, message):
+        self.counts["error"] += 1
+        self._write({"type": "file", "run_id": self.run_id, "status": "error", "input": str(file_path),
+                     "error": message})
+
+    def file_skipped(self, file_path):
+        self.counts["skipped"] += 1
+        self._write({"type": "file", "run_id": self.run_id, "status": "skipped", "input": str(file_path)})
+
+    def summary(self):
+        wall = time.perf_counter() - self._start
+        processed = self.counts["ok"] + self.counts["error"]
+        stages = {}
+        for name, values in self._stage_values.items():
+            if values:
+                stages[name] = {"p50_ms": round(percentile(values, 50) * 1000, 3),
+                                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                                "total_s": round(sum(values), 3)}
+        summary = {
+            "type": "summary", "run_id": self.run_id, "started": self.started, "workers": self.workers,
+            "wall_seconds": round(wall, 3), "files": dict(self.counts),
+            "files_per_second": round(processed / wall, 3) if wall else None,
+            "mb_per_second": round(self.bytes_in / 2**20 / wall, 3) if wall else None,
+            "bytes_in": self.bytes_in, "bytes_out": self.bytes_out, "stages": stages,
+            "peak_rss": self.peak_rss,
+        }
+        if self.duplicates:
+            # копии получили результат оригинала без обработки
+            summary["duplicates"] = self.duplicates
+            summary["dedup_saved_seconds"] = round(self.saved_seconds, 3)
+        if self.discover_seconds is not None:
+            # время обхода входных папок за всю партию
+            summary["discover_seconds"] = round(self.discover_seconds, 3)
+        if self.video_frames:
+            summary["video_frames"] = self.video_frames
+            summary["video_fps"] = round(self.video_frames / self.video_seconds, 2) if self.video_seconds else None
+        return summary
+
+    def close(self):
+        """Дописывает итоговую строку, закрывает файл и возвращает итог."""
+        summary = self.summary()
+        self._write(summary)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return summary
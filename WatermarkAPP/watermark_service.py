@@ -0,0 +1,510 @@
+"""Локальный HTTP-сервис наложения логотипа для других систем (CMS, выгрузки).
+
+Процессы-обработчики запускаются один раз при старте и сразу прогреваются:
+импорт cv2 и Pillow и подготовка логотипа происходят до первого запроса, кэш
+логотипов живёт в процессе всё время работы сервиса. Изображение из запроса
+обрабатывается в памяти, без временных файлов; партии файлов на диске идут
+через тот же пул.
+
+    python watermark_service.py --logo Logo/logo.png --port 8765 --workers 4
+
+    POST /watermark?position=bottom_right&scale=0.2  тело — изображение, ответ — результат
+    POST /batch    {"items": [{"input": "a.jpg"}], "output_folder": "out", "settings": {...}}
+                   результаты пишутся только внутрь папки --output
+    GET  /metrics  глубина очереди, задержки p50/p95/p99, счётчики
+    GET  /health
+
+По умолчанию слушает 127.0.0.1: сервис рассчитан на соседние процессы той же машины.
+"""
+import sys
+import io
+import os
+import json
+import time
+import argparse
+import logging
+import threading
+import multiprocessing
+import signal
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+from PIL import Image
+
+from watermark_engine import (DEFAULT_ENCODER, ENCODER_PROFILES, POSITIONS, RENDITION_FORMATS, PreparedLogoCache,
+                              WatermarkSettings, output_file_name, peak_rss_bytes, reserve_output_path,
+                              unsupported_format, watermark_file, watermark_image_bytes)
+from watermark_report import StageTimer, percentile
+
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 200 * 2**20  # самое большое изображение в запросе
+LATENCY_WINDOW = 1000  # последних запросов для перцентилей задержки
+CONTENT_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+# кэш логотипов внутри процесса-обработчика (у каждого процесса свой)
+_service_cache = None
+
+
+def _init_service_worker(settings: WatermarkSettings):
+    """Прогрев процесса до первого задания: кодеки Pillow, cv2 и логотип в кэше."""
+    # Ctrl+C получает вся группа процессов; сервис останавливает родитель
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    global _service_cache
+    _service_cache = PreparedLogoCache()
+    sample = io.BytesIO()
+    Image.new("RGB", (640, 480), (128, 128, 128)).save(sample, "JPEG")
+    watermark_image_bytes(sample.getvalue(), settings, _service_cache)
+    # логотип для кадров видео (/batch) готовится через cv2 — импорт и первый вызов тоже до запроса
+    _service_cache.get(settings.logo_path, (1280, 720), settings.logo_scale, settings.logo_alpha, "BGRA")
+
+
+def _worker_pid(hold):
+    # задание держит прогретый процесс, чтобы следующее досталось ещё не прогретому
+    time.sleep(hold)
+    return os.getpid()
+
+
+def _render_bytes(settings: WatermarkSettings, data, image_format):
+    timer = StageTimer()
+    result, image_format = watermark_image_bytes(data, settings, _service_cache, image_format, timer)
+    return result, image_format, sum(timer.stages.values())
+
+
+def _render_file(settings: WatermarkSettings, file_path: Path, output_file: Path):
+    report = watermark_file(file_path, output_file, settings, _service_cache)
+    report["peak_rss"] = peak_rss_bytes()
+    return report
+
+
+class QueueFull(Exception):
+    """В пуле уже max_queue заданий: клиенту стоит повторить запрос позже."""
+
+
+class ServiceMetrics:
+    """Счётчики и задержки запросов; обновляются из потоков HTTP-сервера."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.images = 0
+        self.batch_files = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)  # от получения тела до готового результата, секунд
+        self.queue_waits = deque(maxlen=LATENCY_WINDOW)  # из них ожидание свободного обработчика
+
+    def request(self):
+        with self._lock:
+            self.requests += 1
+
+    def error(self, rejected=False):
+        with self._lock:
+            self.errors += 1
+            if rejected:
+                self.rejected += 1
+
+    def image_done(self, seconds, queue_wait, bytes_in, bytes_out):
+        with self._lock:
+            self.images += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.latencies.append(seconds)
+            self.queue_waits.append(queue_wait)
+
+    def file_done(self, report):
+        with self._lock:
+            self.batch_files += 1
+            self.bytes_in += report.get("bytes_in", 0)
+            self.bytes_out += report.get("bytes_out", 0)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = list(self.latencies)
+            waits = list(self.queue_waits)
+            result = {"uptime_seconds": round(time.monotonic() - self._start, 3), "requests_total": self.requests,
+                      "errors_total": self.errors, "rejected_total": self.rejected, "images_total": self.images,
+                      "batch_files_total": self.batch_files, "bytes_in_total": self.bytes_in,
+                      "bytes_out_total": self.bytes_out}
+        result["latency_ms"] = {f"p{q}": round(percentile(latencies, q) * 1000, 3) if latencies else None
+                                for q in (50, 95, 99)}
+        result["queue_wait_ms"] = {f"p{q}": round(percentile(waits, q) * 1000, 3) if waits else None
+                                   for q in (50, 95, 99)}
+        return result
+
+
+class WatermarkService:
+    """Прогретый пул процессов, настройки по умолчанию и метрики."""
+
+    def __init__(self, settings: WatermarkSettings, workers, max_queue):
+        self.settings = settings
+        self.workers = workers
+        self.max_queue = max_queue
+        self.metrics = ServiceMetrics()
+        self._lock = threading.Lock()
+        self._depth = 0  # заданий в пуле: в работе и ждущих обработчика
+        self._reserved = set()  # имена результатов партий, ещё не появившиеся на диске
+        self.output_root = settings.output_folder.resolve()
+        self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_service_worker, initargs=(settings,))
+
+    def warm(self):
+        """Запускает все процессы и ждёт, пока они прогреются."""
+        start = time.perf_counter()
+        # пул запускает процесс на каждое задание, пока нет свободных, а задание
+        # выполняется только после прогрева в initializer; ждём ответа от каждого процесса
+        pids = set()
+        while len(pids) < self.workers:
+            pids.update(f.result() for f in [self.pool.submit(_worker_pid, 0.05) for _ in range(self.workers)])
+        logging.info(f"Обработчики прогреты за {time.perf_counter() - start:.2f} с: {len(pids)} процессов")
+
+    @property
+    def queue_depth(self):
+        with self._lock:
+            return self._depth
+
+    def submit(self, fn, *args, block=False):
+        """Ставит задание в пул; при полной очереди — QueueFull (block=True — ставит всё равно)."""
+        with self._lock:
+            if not block and self._depth >= self.max_queue:
+                raise QueueFull()
+            self._depth += 1
+        try:
+            future = self.pool.submit(fn, *args)
+        except BaseException:
+            self._job_done(None)
+            raise
+        future.add_done_callback(self._job_done)
+        return future
+
+    def _job_done(self, future):
+        with self._lock:
+            self._depth -= 1
+
+    def settings_for(self, params):
+        """Настройки по умолчанию с переопределениями из запроса; ValueError при неверных значениях."""
+        if not isinstance(params, dict):
+            raise ValueError("settings: нужен объект")
+        changes = {}
+        try:
+            if "position" in params:
+                if params["position"] not in POSITIONS:
+                    raise ValueError(f"position: одно из {', '.join(POSITIONS)}")
+                changes["logo_position"] = params["position"]
+            if "scale" in params:
+                changes["logo_scale"] = float(params["scale"])
+                if not 0 < changes["logo_scale"] <= 1:
+                    raise ValueError("scale должен быть в (0, 1]")
+            if "alpha" in params:
+                changes["logo_alpha"] = float(params["alpha"])
+                if not 0 <= changes["logo_alpha"] <= 1:
+                    raise ValueError("alpha должна быть в [0, 1]")
+            for key in ("offset_x", "offset_y"):
+                if key in params:
+                    changes[key] = int(params[key])
+        except (TypeError, ValueError) as e:
+            raise ValueError(str(e)) from None
+        if "encoder" in params:
+            # значение из JSON может быть списком или объектом — такие не ищем в словаре профилей
+            if not isinstance(params["encoder"], str) or params["encoder"] not in ENCODER_PROFILES:
+                raise ValueError(f"encoder: одно из {', '.join(ENCODER_PROFILES)}")
+            changes["encoder"] = params["encoder"]
+        if "auto_variant" in params:
+            changes["auto_variant"] = str(params["auto_variant"]).lower() in ("1", "true", "yes")
+        if "logo" in params:
+            # только логотипы из папки логотипа по умолчанию: клиент не выбирает произвольные файлы
+            logo_dir = Path(self.settings.logo_path).parent
+            logo_path = logo_dir / Path(str(params["logo"])).name
+            if not logo_path.is_file():
+                raise ValueError(f"логотип не найден в {logo_dir}: {params['logo']}")
+            changes["logo_path"] = str(logo_path)
+        return self.settings._replace(**changes)
+
+    def render(self, data, params):
+        """Изображение из запроса -> (байты результата, формат)."""
+        image_format = params.get("format")
+        if image_format is not None and image_format not in RENDITION_FORMATS:
+            raise ValueError(f"format: одно из {', '.join(RENDITION_FORMATS)}")
+        settings = self.settings_for(params)
+        start = time.perf_counter()
+        result, image_format, work_seconds = self.submit(_render_bytes, settings, data, image_format).result()
+        elapsed = time.perf_counter() - start
+        self.metrics.image_done(elapsed, max(0.0, elapsed - work_seconds), len(data), len(result))
+        return result, image_format
+
+    def output_path(self, path, base=None):
+        """Путь результата внутри папки --output; ValueError, если path выходит за неё.
+
+        Относительный path считается от base (по умолчанию — от папки --output).
+        """
+        path = Path(str(path))
+        resolved = ((base or self.output_root) / path).resolve()
+        if not resolved.is_relative_to(self.output_root):
+            raise ValueError(f"путь результата вне папки {self.output_root}: {path}")
+        return resolved
+
+    def run_manifest(self, manifest):
+        """Партия файлов на диске: {"items": [{"input", "output"?}], "output_folder", "settings"}.
+
+        output_folder и output отдельных файлов считаются от папки --output и не
+        могут выходить за неё. В пул ставится не больше max_queue файлов партии
+        за раз: большая партия не получает отказ, а ждёт. Возвращает результаты
+        в порядке items.
+        """
+        items = manifest.get("items") if isinstance(manifest, dict) else None
+        if not isinstance(items, list) or not items:
+            raise ValueError("items: нужен непустой список")
+        settings = self.settings_for(manifest.get("settings") or {})
+        output_folder = self.output_path(manifest.get("output_folder") or ".")
+        settings = settings._replace(output_folder=output_folder)
+        results = [None] * len(items)
+        jobs = {}  # номер в items -> (исходник, результат)
+        with self._lock:
+            try:
+                for index, item in enumerate(items):
+                    if isinstance(item, str):
+                        item = {"input": item}
+                    file_path = Path(str(item.get("input", ""))) if isinstance(item, dict) else Path()
+                    if not file_path.is_file() or unsupported_format(file_path) is not None:
+                        results[index] = {"input": str(file_path), "status": "error",
+                                          "error": "файл не найден или его формат не поддерживается"}
+                        continue
+                    if item.get("output"):
+                        output_file = self.output_path(item["output"], output_folder)
+                        if output_file == output_folder:
+                            raise ValueError(f"output: нужен путь к файлу: {item['output']}")
+                        if output_file in self._reserved:
+                            # путь уже у другого файла этой или параллельной партии: два процесса писали бы в один файл
+                            results[index] = {"input": str(file_path), "output": str(output_file), "status": "error",
+                                              "error": "этот путь результата уже занят другим файлом"}
+                            continue
+                        self._reserved.add(output_file)
+                    else:
+                        output_file = reserve_output_path(output_folder / output_file_name(file_path, settings),
+                                                          self._reserved)
+                    jobs[index] = (file_path, output_file)
+            except ValueError:
+                # партия с недопустимым путём не запускается вовсе — имена уже разобранных файлов освобождаются
+                for _, output_file in jobs.values():
+                    self._reserved.discard(output_file)
+                raise
+        running = {}
+
+        def collect(futures):
+            for future in futures:
+                index = running.pop(future)
+                file_path, output_file = jobs[index]
+                try:
+                    report = future.result()
+                except Exception as e:
+                    logging.error(f"Ошибка при обработке {file_path}: {e}")
+                    results[index] = {"input": str(file_path), "status": "error", "error": str(e)}
+                    continue
+                self.metrics.file_done(report)
+                results[index] = {"input": str(file_path), "output": str(output_file), "status": "ok",
+                                  "seconds": round(report["seconds"], 3), "bytes_out": report.get("bytes_out")}
+
+        try:
+            for index, (file_path, output_file) in jobs.items():
+                while len(running) >= self.max_queue:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    collect(done)
+                output_file.parent.mkdir(parents=True, exist_ok=True)
+                running[self.submit(_render_file, settings, file_path, output_file, block=True)] = index
+            collect(list(running))
+        finally:
+            for future in running:
+                future.cancel()
+            with self._lock:
+                for _, output_file in jobs.values():
+                    self._reserved.discard(output_file)
+        return results
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Запросы к WatermarkService; server.service — экземпляр сервиса."""
+
+    server_version = "WatermarkService/1.0"
+    protocol_version = "HTTP/1.1"  # соединение держится между запросами клиента
+
+    @property
+    def service(self) -> WatermarkService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, data, headers=()):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8",
+                   headers)
+
+    def _send_error(self, status, message, headers=()):
+        self.service.metrics.error(rejected=status == 503)
+        self._send_json(status, {"error": message}, headers)
+
+    def _read_body(self, limit):
+        """Тело запроса или None (ответ об ошибке уже отправлен)."""
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self.close_connection = True
+            self._send_error(411, "нужен заголовок Content-Length")
+            return None
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0 or length > limit:
+            # тело не читаем, поэтому соединение дальше не годится
+            self.close_connection = True
+            self._send_error(413, f"тело запроса больше {limit} байт" if length > limit else "неверный Content-Length")
+            return None
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        self.service.metrics.request()
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/metrics":
+            metrics = self.service.metrics.snapshot()
+            metrics.update(workers=self.service.workers, queue_depth=self.service.queue_depth,
+                           max_queue=self.service.max_queue)
+            self._send_json(200, metrics)
+        else:
+            self._send_error(404, f"нет такого адреса: {path}")
+
+    def do_POST(self):
+        self.service.metrics.request()
+        url = urlsplit(self.path)
+        if url.path not in ("/watermark", "/batch"):
+            self._send_error(404, f"нет такого адреса: {url.path}")
+            return
+        # при полной очереди отвечаем сразу, не принимая тело изображения
+        if url.path == "/watermark" and self.service.queue_depth >= self.service.max_queue:
+            self.close_connection = True
+            self._send_error(503, "очередь заполнена, повторите позже", [("Retry-After", "1")])
+            return
+        body = self._read_body(self.server.max_body)
+        if body is None:
+            return
+        try:
+            if url.path == "/watermark":
+                result, image_format = self.service.render(body, dict(parse_qsl(url.query)))
+                self._send(200, result, CONTENT_TYPES[image_format])
+            else:
+                self._send_json(200, {"results": self.service.run_manifest(json.loads(body or b"{}"))})
+        except QueueFull:
+            self._send_error(503, "очередь заполнена, повторите позже", [("Retry-After", "1")])
+        except (ValueError, OSError) as e:
+            # JSONDecodeError и нераспознанное изображение (UnidentifiedImageError) — тоже ValueError/OSError
+            self._send_error(400, str(e))
+        except Exception as e:
+            logging.exception(f"Ошибка при обработке запроса {self.path}")
+            self._send_error(500, str(e))
+
+
+class WatermarkHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: WatermarkService, max_body=MAX_BODY_BYTES):
+        super().__init__(address, ServiceHandler)
+        self.service = service
+        self.max_body = max_body
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Локальный HTTP-сервис наложения логотипа с прогретым пулом "
+                                                 "процессов.")
+    parser.add_argument("--logo", type=Path, required=True,
+                        help="логотип по умолчанию; параметр logo в запросе выбирает файл из той же папки")
+    parser.add_argument("--position", choices=POSITIONS, default="center_top", help="позиция логотипа")
+    parser.add_argument("--offset-x", type=int, default=20, help="отступ по X, пикселей")
+    parser.add_argument("--offset-y", type=int, default=20, help="отступ по Y, пикселей")
+    parser.add_argument("--scale", type=float, default=0.2, help="размер логотипа, доля кадра (0.1–1.0)")
+    parser.add_argument("--alpha", type=float, default=1.0, help="непрозрачность логотипа (0–1)")
+    parser.add_argument("--auto-variant", action="store_true",
+                        help="выбирать вариант логотипа (обычный, _inverted, _mono) по контрасту с фоном")
+    parser.add_argument("--encoder", choices=ENCODER_PROFILES, default=DEFAULT_ENCODER, help="профиль кодирования")
+    parser.add_argument("--output", type=Path, default=Path("output"),
+                        help="папка результатов /batch, если в запросе не указана другая")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес для приёма запросов")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="порт")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument("--max-queue", type=int, default=0,
+                        help="заданий в пуле, сверх которых /watermark отвечает 503 (0 — 4 на процесс)")
+    parser.add_argument("--max-body", type=int, default=MAX_BODY_BYTES // 2**20, metavar="МБ",
+                        help="наибольший размер изображения в запросе")
+    parser.add_argument("--log-file", help="писать подробный лог в файл")
+    return parser
+
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.log_file:
+        logging.basicConfig(filename=args.log_file, level=logging.INFO,
+                            format='%(asctime)s - %(levelname)s - %(message)s', encoding='utf-8')
+    else:
+        logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    if not args.logo.is_file():
+        parser.error(f"логотип не найден: {args.logo}")
+    if not 0 < args.scale <= 1 or not 0 <= args.alpha <= 1:
+        parser.error("--scale должен быть в (0, 1], --alpha — в [0, 1]")
+    workers = max(1, args.workers)
+    settings = WatermarkSettings(
+        logo_path=str(args.logo), logo_scale=args.scale, logo_alpha=args.alpha, logo_position=args.position,
+        offset_x=args.offset_x, offset_y=args.offset_y, output_folder=args.output,
+        auto_variant=args.auto_variant, encoder=args.encoder,
+    )
+    service = WatermarkService(settings, workers, args.max_queue if args.max_queue > 0 else workers * 4)
+    try:
+        # порт занимаем до прогрева: занятый порт — ошибка сразу, а не после запуска процессов
+        server = WatermarkHTTPServer((args.host, args.port), service, max(1, args.max_body) * 2**20)
+    except OSError as e:
+        service.close()
+        parser.error(f"не удалось открыть {args.host}:{args.port}: {e}")
+    try:
+        service.warm()
+    except BaseException:
+        server.server_close()
+        service.close()
+        raise
+    host, port = server.server_address[:2]
+    print(f"Сервис слушает http://{host}:{port}, процессов: {workers}; Ctrl+C — остановить", flush=True)
+
+    def stop(signum, frame):
+        # shutdown ждёт выхода из serve_forever, поэтому из обработчика сигнала — в отдельном потоке
+        print("Остановка сервиса…", file=sys.stderr, flush=True)
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Остановка сервиса…", file=sys.stderr, flush=True)
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Миниатюры логотипов для списка в GUI.
+
+Миниатюры хранятся на диске (ключ — путь, mtime и размер файла) и грузятся в
+фоновом потоке, поэтому папка с сотнями больших PNG не подвешивает окно:
+при повторном сканировании перечитываются только новые и изменённые файлы.
+"""
+import os
+import hashlib
+import logging
+from pathlib import Path
+from PyQt5.QtCore import Qt, QThread, QStandardPaths, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader
+
+THUMB_SIZE = 48
+LOGO_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp'}
+_MAX_CACHED = 2000
+
+
+def default_cache_dir():
+    base = QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation)
+    return Path(base) / "WatermarkApp" / "logo_thumbs"
+
+
+def thumbnail_key(path, stat):
+    """(путь, mtime_ns, размер) — изменение любого из них даёт новую миниатюру."""
+    return (str(Path(path).resolve()), stat.st_mtime_ns, stat.st_size)
+
+
+def scan_logo_dir(logo_dir):
+    """Список (путь, ключ миниатюры) для картинок в папке, по имени. Только stat, без декодирования."""
+    logos = []
+    try:
+        with os.scandir(logo_dir) as it:
+            for entry in it:
+                if entry.is_file() and Path(entry.name).suffix.lower() in LOGO_EXTENSIONS:
+                    try:
+                        logos.append((Path(entry.path), thumbnail_key(entry.path, entry.stat())))
+                    except OSError:
+                        # файл удалили между листингом и stat
+                        continue
+    except OSError as e:
+        logging.error(f"Не удалось прочитать папку логотипов {logo_dir}: {e}")
+    logos.sort(key=lambda item: item[0].name)
+    return logos
+
+
+class ThumbnailCache:
+    """Миниатюры на диске: по PNG на ключ. Устаревшие не удаляются сразу, а вытесняются по возрасту."""
+
+    def __init__(self, cache_dir=None, size=THUMB_SIZE):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.size = size
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logging.error(f"Не удалось создать кэш миниатюр {self.cache_dir}: {e}")
+
+    def _file(self, key):
+        name = hashlib.blake2b(f"{key}|{self.size}".encode("utf-8"), digest_size=16).hexdigest()
+        return self.cache_dir / f"{name}.png"
+
+    def load(self, key):
+        """Миниатюра из кэша или None."""
+        image = QImage(str(self._file(key)))
+        return None if image.isNull() else image
+
+    def make(self, path, key):
+        """Читает миниатюру из кэша, иначе декодирует файл сразу в уменьшенном размере и сохраняет."""
+        image = self.load(key)
+        if image is not None:
+            return image
+        reader = QImageReader(str(path))
+        reader.setAutoTransform(True)
+        full_size = reader.size()
+        if full_size.isValid():
+            # форматы с поддержкой (JPEG) декодируются сразу уменьшенными
+            reader.setScaledSize(full_size.scaled(self.size, self.size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            return None
+        if image.width() > self.size or image.height() > self.size:
+            image = image.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if not image.save(str(self._file(key)), "PNG"):
+            logging.info(f"Не удалось сохранить миниатюру в кэш: {path}")
+        return image
+
+    def prune(self, max_files=_MAX_CACHED):
+        """Удаляет самые старые миниатюры сверх max_files."""
+        try:
+            entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".png")]
+        except OSError:
+            return
+        if len(entries) <= max_files:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class ThumbnailLoader(QThread):
+    """Готовит миниатюры для списка (путь, ключ) и отдаёт их по одной.
+
+    В сигнале QImage, а не QPixmap: QPixmap можно создавать только в GUI-потоке.
+    """
+    thumbnail_ready = pyqtSignal(str, object, QImage)
+
+    def __init__(self, cache: ThumbnailCache, logos):
+        super().__init__()
+        self.cache = cache
+        self.logos = list(logos)
+
+    def run(self):
+        for path, key in self.logos:
+            if self.isInterruptionRequested():
+                return
+            try:
+                image = self.cache.make(path, key)
+            except Exception as e:
+                logging.error(f"Ошибка миниатюры логотипа {path}: {e}")
+                continue
+            if image is not None:
+                self.thumbnail_ready.emit(str(path), key, image)
+        self.cache.prune()
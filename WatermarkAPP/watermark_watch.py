@@ -0,0 +1,100 @@
+"""Наблюдение за входными папками (горячая папка).
+
+Папки опрашиваются через os.scandir раз в interval секунд; wake (например, по
+сигналу QFileSystemWatcher) будит опрос сразу. На сетевых папках события
+файловой системы приходят не всегда, поэтому опрос остаётся основой, а
+события лишь сокращают задержку. Файл отдаётся в обработку один раз, когда
+его размер и время изменения не менялись между двумя опросами и не меньше
+stable_seconds, а на Windows — когда его больше не держит открытым копирующая
+программа. Перезаписанный файл отдаётся снова.
+"""
+import os
+import sys
+import time
+import logging
+from pathlib import Path
+
+from watermark_engine import is_media_suffix
+
+WATCH_INTERVAL = 1.0  # секунд между опросами папок
+STABLE_SECONDS = 2.0  # сколько файл не должен меняться, чтобы считаться дописанным
+
+
+def scan_media_files(paths, exclude=()):
+    """{путь: (размер, mtime_ns)} для изображений и видео в папках, рекурсивно.
+
+    Папки из exclude (например, папка результатов внутри входной) и скрытые
+    файлы и папки (временные файлы копирования, сегменты видео) пропускаются.
+    """
+    exclude = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+    found = {}
+    stack = [Path(p) for p in paths]
+    while stack:
+        folder = stack.pop()
+        if os.path.normcase(os.path.abspath(folder)) in exclude:
+            continue
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith((".", "~$")):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(Path(entry.path))
+                        elif entry.is_file() and is_media_suffix(os.path.splitext(entry.name)[1].lower()):
+                            stat = entry.stat()
+                            found[Path(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        # файл удалили или переименовали между листингом и stat
+                        continue
+        except OSError as e:
+            logging.warning(f"Не удалось прочитать папку {folder}: {e}")
+    return found
+
+
+def _writer_finished(path):
+    """На Windows копирующая программа держит файл открытым без общего доступа на запись."""
+    if sys.platform != "win32":
+        return True
+    try:
+        with open(path, "ab"):
+            return True
+    except OSError:
+        return False
+
+
+def watch_media_files(paths, cancel, exclude=(), interval=WATCH_INTERVAL, stable_seconds=STABLE_SECONDS,
+                      wake=None):
+    """Бесконечный генератор дописанных файлов в папках paths до установки cancel.
+
+    Уже лежащие в папках файлы тоже отдаются (манифест пропустит обработанные
+    раньше). Для run_batch: он обходит генератор в своём потоке и ставит файлы
+    в пул по мере появления. wake — threading.Event: внеочередной опрос.
+    """
+    last = {}  # путь -> состояние на прошлом опросе
+    yielded = {}  # путь -> состояние, в котором файл отдан в обработку
+    logging.info(f"Наблюдение за папками: {', '.join(str(p) for p in paths)}")
+    while not cancel.is_set():
+        current = scan_media_files(paths, exclude)
+        now_ns = time.time_ns()
+        for path, state in current.items():
+            if yielded.get(path) == state:
+                continue
+            # дописан: не менялся с прошлого опроса и с последней записи прошло stable_seconds
+            if (last.get(path) == state and (now_ns - state[1]) / 1e9 >= stable_seconds
+                    and _writer_finished(path)):
+                yielded[path] = state
+                yield path
+                if cancel.is_set():
+                    return
+        # удалённые файлы забываем, чтобы словари не росли
+        for path in [p for p in yielded if p not in current]:
+            del yielded[path]
+        last = current
+        if wake is not None:
+            if wake.wait(interval):
+                wake.clear()
+                # события приходят пачкой, пока файл копируется — дадим ему дописаться
+                cancel.wait(min(interval, 0.2))
+        else:
+            cancel.wait(interval)
@@ -1,12 +1,14 @@
 # -*- mode: python ; coding: utf-8 -*-
 
 
+# ffmpeg в сборку не входит: сегменты длинных видео склеиваются ffmpeg из PATH.
 a = Analysis(
     ['WatermarkAPP/watermark_app.py'],
     pathex=[],
     binaries=[],
     datas=[('WatermarkAPP/Logo', 'Logo'), ('WatermarkAPP/Icon', 'Icon')],
-    hiddenimports=[],
+    # cv2, numpy и PIL импортируются лениво (importlib), анализ их не видит
+    hiddenimports=['cv2', 'numpy', 'PIL.Image', 'xxhash'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],